@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import random
+
+import aiohttp
+
+from WhatsApp_config.graph_client import DEFAULT_BASE_URL, RETRY_STATUSES, parse_retry_after
+
+
+class AsyncGraphClient:
+    """
+    asyncio counterpart of GraphClient for the aiohttp server.
+
+    A single aiohttp.ClientSession keeps up to `pool_size` connections open;
+    a reply waiting on the API only holds a coroutine, not a thread. Retries
+    follow the same rules as GraphClient: 429/5xx and failed connections are
+    retried with jittered backoff or Retry-After, read timeouts are not.
+    Create it inside the running event loop.
+    """
+
+    def __init__(
+        self,
+        access_token,
+        phone_number_id,
+        version,
+        base_url=DEFAULT_BASE_URL,
+        pool_size=100,
+        timeout=10,
+        max_retries=3,
+        backoff_base=0.5,
+        backoff_max=8.0,
+        retry_after_max=30.0,
+    ):
+        self.messages_url = f"{base_url.rstrip('/')}/{version}/{phone_number_id}/messages"
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool_size),
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            headers={
+                "Content-type": "application/json",
+                "Authorization": f"Bearer {access_token}",
+            },
+        )
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def send(self, data):
+        """
+        POST a JSON message payload and return (status, body text).
+        Raises aiohttp.ClientError once the retries are exhausted.
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self.session.post(self.messages_url, data=data) as response:
+                    text = await response.text()
+                    if response.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                        response.raise_for_status()
+                        return response.status, text
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    delay = (
+                        min(retry_after, self.retry_after_max)
+                        if retry_after is not None
+                        else self._backoff(attempt)
+                    )
+                    logging.warning(f"Graph API answered {response.status}, retrying in {delay:.2f}s")
+            except aiohttp.ClientConnectionError as e:
+                # Only retry when the request never reached the API
+                if attempt >= self.max_retries or not isinstance(e, aiohttp.ClientConnectorError):
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"Graph API connection failed ({e}), retrying in {delay:.2f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        await self.session.close()
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MessageDeduper:
+    """
+    Bounded in-memory set of recently seen WhatsApp message ids.
+
+    Ids are forgotten after `ttl` seconds or, when more than `max_entries`
+    are held, oldest first. `hits` counts redeliveries that were dropped,
+    `misses` counts messages seen for the first time.
+    """
+
+    def __init__(self, max_entries=100000, ttl=86400.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def first_seen(self, message_id):
+        """Record `message_id`; True the first time, False for a redelivery."""
+        now = time.monotonic()
+        with self._lock:
+            seen_at = self._seen.get(message_id)
+            if seen_at is not None and now - seen_at <= self.ttl:
+                self.hits += 1
+                return False
+            self._seen[message_id] = now
+            self._seen.move_to_end(message_id)
+            self.misses += 1
+            while self._seen:
+                oldest_id, oldest_at = next(iter(self._seen.items()))
+                if len(self._seen) <= self.max_entries and now - oldest_at <= self.ttl:
+                    break
+                del self._seen[oldest_id]
+            return True
+
+    def forget(self, message_id):
+        """Let `message_id` through again: it was marked seen but could not be processed."""
+        with self._lock:
+            self._seen.pop(message_id, None)
+
+    def stats(self):
+        return {"backend": "memory", "size": len(self._seen), "hits": self.hits, "misses": self.misses}
+
+
+class SqliteDeduper:
+    """
+    Message id set in a SQLite WAL file shared by several worker processes.
+    Each thread of each process uses its own connection.
+    """
+
+    # Expired ids are deleted once every this many new messages
+    PURGE_EVERY = 1000
+
+    def __init__(self, path, ttl=86400.0):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS seen_messages (id TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS seen_messages_seen_at ON seen_messages (seen_at)")
+
+    @property
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def first_seen(self, message_id):
+        now = time.time()
+        conn = self.connection
+        # An expired id counts as new again
+        conn.execute("DELETE FROM seen_messages WHERE id = ? AND seen_at < ?", (message_id, now - self.ttl))
+        inserted = conn.execute(
+            "INSERT OR IGNORE INTO seen_messages (id, seen_at) VALUES (?, ?)", (message_id, now)
+        ).rowcount
+        with self._lock:
+            if not inserted:
+                self.hits += 1
+                return False
+            self.misses += 1
+            purge = self.misses % self.PURGE_EVERY == 0
+        if purge:
+            conn.execute("DELETE FROM seen_messages WHERE seen_at < ?", (now - self.ttl,))
+        return True
+
+    def forget(self, message_id):
+        self.connection.execute("DELETE FROM seen_messages WHERE id = ?", (message_id,))
+
+    def stats(self):
+        return {"backend": "sqlite", "hits": self.hits, "misses": self.misses}
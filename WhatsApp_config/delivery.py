@@ -0,0 +1,282 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from immobot_config.metrics import DELIVERY_STATUSES
+from WhatsApp_config.events import parse_webhook
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    -- Outbound message id (wamid) returned by the Graph API for the reply
+    id TEXT PRIMARY KEY,
+    recipient TEXT,
+    -- Unix timestamps reported by WhatsApp for each status
+    sent_at INTEGER,
+    delivered_at INTEGER,
+    read_at INTEGER,
+    failed_at INTEGER,
+    error_code INTEGER,
+    error_title TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deliveries_recipient ON deliveries (recipient);
+CREATE INDEX IF NOT EXISTS deliveries_updated_at ON deliveries (updated_at);
+"""
+
+# Status -> column of its timestamp. "read" implies "delivered", which
+# WhatsApp does not always report separately.
+STATUS_COLUMNS = {"sent": 2, "delivered": 3, "read": 4, "failed": 5}
+
+_UPSERT = """
+INSERT INTO deliveries (id, recipient, sent_at, delivered_at, read_at, failed_at, error_code, error_title, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    recipient = coalesce(excluded.recipient, recipient),
+    sent_at = coalesce(min(sent_at, excluded.sent_at), sent_at, excluded.sent_at),
+    delivered_at = coalesce(min(delivered_at, excluded.delivered_at), delivered_at, excluded.delivered_at),
+    read_at = coalesce(min(read_at, excluded.read_at), read_at, excluded.read_at),
+    failed_at = coalesce(min(failed_at, excluded.failed_at), failed_at, excluded.failed_at),
+    error_code = coalesce(excluded.error_code, error_code),
+    error_title = coalesce(excluded.error_title, error_title),
+    updated_at = excluded.updated_at
+"""
+
+
+def _timestamp(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def merge_statuses(statuses, rows, now):
+    """
+    Fold status callbacks into `rows` (outbound message id -> row of the
+    deliveries table), so a message reported sent, delivered and read in one
+    batch is written once. Returns the number of statuses that had an id.
+    """
+    count = 0
+    for status in statuses:
+        message_id = status.get("id")
+        if not message_id:
+            continue
+        count += 1
+        kind = status.get("status")
+        DELIVERY_STATUSES.labels(kind if kind in STATUS_COLUMNS else "other").inc()
+        row = rows.get(message_id)
+        if row is None:
+            row = rows[message_id] = [message_id, None, None, None, None, None, None, None, now]
+        row[1] = status.get("recipient_id") or row[1]
+        column = STATUS_COLUMNS.get(kind)
+        timestamp = _timestamp(status.get("timestamp"))
+        if column is not None and timestamp is not None:
+            row[column] = timestamp if row[column] is None else min(row[column], timestamp)
+        if kind == "failed":
+            error = (status.get("errors") or [{}])[0]
+            row[6] = _timestamp(error.get("code"))
+            row[7] = error.get("title") or error.get("message")
+    return count
+
+
+def mask_number(wa_id):
+    """A phone number with only its last four digits left, for reports served over HTTP."""
+    wa_id = wa_id or ""
+    return "*" * max(len(wa_id) - 4, 0) + wa_id[-4:]
+
+
+def masked_recipients(rows):
+    """`failing_recipients` rows with their phone numbers masked."""
+    return [dict(row, recipient=mask_number(row["recipient"])) for row in rows]
+
+
+class DeliveryTracker:
+    """
+    Delivery statuses (sent/delivered/read/failed) of outgoing messages, kept
+    in a SQLite WAL file shared by worker processes and keyed by outbound
+    message id.
+
+    Webhook handlers only append the raw body of a status callback to an
+    in-memory buffer: no parsing, no I/O, no lock. A flusher thread parses
+    what accumulated every `flush_interval` seconds (or as soon as
+    `batch_size` payloads wait) and writes it in one transaction. When the
+    buffer holds `max_buffered` payloads, new ones are dropped and counted:
+    statuses are statistics, they must never slow the webhook down.
+    """
+
+    # Rows not updated for `retention` seconds are deleted once every this many flushes
+    PURGE_EVERY = 600
+
+    def __init__(self, path, flush_interval=1.0, batch_size=1000, max_buffered=100000, retention=7 * 86400.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffered = max_buffered
+        self.retention = retention
+        self._local = threading.local()
+        self._buffer = deque()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self.buffered = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.statuses = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.last_flush_ms = 0.0
+        self.connection.executescript(SCHEMA)
+        self._thread = threading.Thread(target=self._run, name="immobot-delivery", daemon=True)
+        self._thread.start()
+
+    @property
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            # Losing the last flush on a power cut is acceptable for statistics
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add(self, payload):
+        """
+        Buffer a status callback: the raw webhook body (bytes), or a list of
+        already parsed status objects. Never blocks.
+        """
+        buffer = self._buffer
+        if len(buffer) >= self.max_buffered:
+            self.dropped += 1
+            return False
+        buffer.append(payload)
+        self.buffered += 1
+        if len(buffer) >= self.batch_size and not self._wake.is_set():
+            self._wake.set()
+        return True
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows written."""
+        with self._flush_lock:
+            buffer = self._buffer
+            if not buffer:
+                return 0
+            start = time.perf_counter()
+            now = time.time()
+            rows = {}
+            for _ in range(len(buffer)):
+                payload = buffer.popleft()
+                if isinstance(payload, (bytes, bytearray, memoryview)):
+                    try:
+                        payload = parse_webhook(payload).statuses
+                    except ValueError:
+                        self.invalid += 1
+                        continue
+                self.statuses += merge_statuses(payload, rows, now)
+            if not rows:
+                return 0
+            conn = self.connection
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany(_UPSERT, rows.values())
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                logging.error(f"Could not write {len(rows)} delivery statuses: {e}")
+                self.dropped += len(rows)
+                return 0
+            self.flushes += 1
+            self.rows_written += len(rows)
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+            return len(rows)
+
+    def purge(self):
+        """Forget messages whose status did not change for `retention` seconds."""
+        return self.connection.execute(
+            "DELETE FROM deliveries WHERE updated_at < ?", (time.time() - self.retention,)
+        ).rowcount
+
+    def _run(self):
+        flushes = 0
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                if self.flush():
+                    flushes += 1
+                    if flushes % self.PURGE_EVERY == 0:
+                        self.purge()
+            except Exception:
+                logging.exception("Delivery status flush failed")
+        self.flush()
+
+    def close(self, timeout=10.0):
+        """Write what is buffered and stop the flusher thread."""
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def summary(self, recipient=None):
+        """
+        Message counts per status, failure rate and delivery latency (sent to
+        delivered, in seconds), of every message or of one recipient's.
+        """
+        where, params = ("WHERE recipient = ?", (recipient,)) if recipient else ("", ())
+        messages, sent, delivered, read, failed, latency_count, latency_avg = self.connection.execute(
+            "SELECT count(*), count(sent_at), count(coalesce(delivered_at, read_at)), count(read_at),"
+            " count(failed_at), count(coalesce(delivered_at, read_at) - sent_at),"
+            f" avg(coalesce(delivered_at, read_at) - sent_at) FROM deliveries {where}",
+            params,
+        ).fetchone()
+        latency = {"count": latency_count, "avg": latency_avg}
+        for name, fraction in (("p50", 0.5), ("p95", 0.95)):
+            latency[name] = None
+            if latency_count:
+                row = self.connection.execute(
+                    "SELECT coalesce(delivered_at, read_at) - sent_at AS latency FROM deliveries"
+                    f" {where} {'AND' if where else 'WHERE'} latency IS NOT NULL"
+                    " ORDER BY latency LIMIT 1 OFFSET ?",
+                    params + (min(int(latency_count * fraction), latency_count - 1),),
+                ).fetchone()
+                latency[name] = row[0]
+        return {
+            "messages": messages,
+            "sent": sent,
+            "delivered": delivered,
+            "read": read,
+            "failed": failed,
+            "failure_rate": failed / messages if messages else 0.0,
+            "delivery_seconds": latency,
+        }
+
+    def failing_recipients(self, limit=10):
+        """Recipients with the most failed messages: (recipient, messages, failed, failure rate)."""
+        rows = self.connection.execute(
+            "SELECT recipient, count(*), count(failed_at) FROM deliveries GROUP BY recipient"
+            " HAVING count(failed_at) > 0 ORDER BY count(failed_at) DESC, count(*) LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [
+            {"recipient": recipient, "messages": messages, "failed": failed, "failure_rate": failed / messages}
+            for recipient, messages, failed in rows
+        ]
+
+    def stats(self):
+        """State of the ingestion pipeline of this process."""
+        return {
+            "buffered": self.buffered,
+            "pending": len(self._buffer),
+            "dropped": self.dropped,
+            "invalid": self.invalid,
+            "statuses": self.statuses,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "avg_rows_per_flush": self.rows_written / self.flushes if self.flushes else 0.0,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
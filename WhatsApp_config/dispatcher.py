@@ -0,0 +1,127 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+
+# Put on a worker queue to make the worker exit once everything before it is done
+_STOP = object()
+
+
+class MessageDispatcher:
+    """
+    Bounded worker pool that processes webhook messages off the request path.
+
+    Every key (the sender's wa_id) is always routed to the same worker, so the
+    messages of one user are handled in the order they arrived while different
+    users are processed in parallel. Each worker owns a bounded queue: when it
+    is full `submit` refuses the job instead of blocking the webhook.
+    """
+
+    def __init__(self, app, workers=4, queue_size=1000):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.app = app
+        per_worker = max(1, -(-queue_size // workers))
+        self._queues = [queue.Queue(maxsize=per_worker) for _ in range(workers)]
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._closed = False
+        self._threads = []
+        for i, q in enumerate(self._queues):
+            thread = threading.Thread(
+                target=self._run, args=(q,), name=f"immobot-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _queue_for(self, key):
+        return self._queues[zlib.crc32(str(key).encode("utf-8")) % len(self._queues)]
+
+    def submit(self, key, func, *args):
+        """
+        Queue `func(*args)` behind the earlier jobs of `key`.
+        Returns False if the pool is shutting down or the queue is full.
+        """
+        if self._closed:
+            return False
+        try:
+            self._queue_for(key).put_nowait((time.monotonic(), func, args))
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            logging.warning(f"Worker queue full, rejecting message from {key}")
+            return False
+        with self._stats_lock:
+            self.submitted += 1
+        return True
+
+    def _run(self, q):
+        while True:
+            job = q.get()
+            try:
+                if job is _STOP:
+                    return
+                enqueued_at, func, args = job
+                waited = time.monotonic() - enqueued_at
+                with self._stats_lock:
+                    self._wait_total += waited
+                    self._wait_max = max(self._wait_max, waited)
+                try:
+                    with self.app.app_context():
+                        func(*args)
+                except Exception:
+                    logging.exception("Background message processing failed")
+                    with self._stats_lock:
+                        self.failed += 1
+                else:
+                    with self._stats_lock:
+                        self.processed += 1
+            finally:
+                q.task_done()
+
+    def queue_depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self):
+        with self._stats_lock:
+            started = self.processed + self.failed
+            return {
+                "workers": len(self._queues),
+                "queue_depth": self.queue_depth(),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "processed": self.processed,
+                "failed": self.failed,
+                "avg_wait_seconds": self._wait_total / started if started else 0.0,
+                "max_wait_seconds": self._wait_max,
+            }
+
+    def shutdown(self, timeout=10.0):
+        """
+        Stop accepting jobs and let the workers drain their queues.
+        Returns True if every worker finished within `timeout` seconds.
+        """
+        if self._closed:
+            return True
+        self._closed = True
+        deadline = time.monotonic() + timeout
+        for q in self._queues:
+            # A full queue still gets its stop marker once the worker frees a slot
+            try:
+                q.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                pass
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        drained = not any(thread.is_alive() for thread in self._threads)
+        if not drained:
+            logging.warning(
+                f"Worker pool shutdown timed out with {self.queue_depth()} queued messages"
+            )
+        return drained
@@ -0,0 +1,76 @@
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+try:
+    # Optional faster decoder, same results as json.loads
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+@dataclass(frozen=True)
+class InboundMessage:
+    """One user message taken out of a webhook delivery."""
+    wa_id: str
+    id: Optional[str]
+    type: str
+    text: Optional[str]
+    timestamp: Optional[str] = None
+    name: Optional[str] = None
+
+
+@dataclass
+class WebhookEvent:
+    """Everything downstream code needs from one webhook POST, extracted in a single walk."""
+    object: Optional[str]
+    messages: List[InboundMessage] = field(default_factory=list)
+    statuses: List[Dict] = field(default_factory=list)
+
+    @classmethod
+    def from_body(cls, body: Dict) -> "WebhookEvent":
+        event = cls(object=body.get("object"))
+        for entry in body.get("entry") or []:
+            for change in entry.get("changes") or []:
+                value = change.get("value") or {}
+                contacts = value.get("contacts") or []
+                names = {c.get("wa_id"): (c.get("profile") or {}).get("name") for c in contacts}
+                default_wa_id = contacts[0].get("wa_id") if contacts else None
+                for message in value.get("messages") or []:
+                    wa_id = message.get("from") or default_wa_id
+                    if not wa_id:
+                        continue
+                    message_type = message.get("type", "text")
+                    event.messages.append(
+                        InboundMessage(
+                            wa_id=wa_id,
+                            id=message.get("id"),
+                            type=message_type,
+                            text=(message.get("text") or {}).get("body") if message_type == "text" else None,
+                            timestamp=message.get("timestamp"),
+                            name=names.get(wa_id),
+                        )
+                    )
+                event.statuses.extend(value.get("statuses") or [])
+        return event
+
+    def is_whatsapp_message(self) -> bool:
+        return bool(self.object) and bool(self.messages)
+
+
+def is_status_only(raw: bytes) -> bool:
+    """
+    Cheap byte scan for delivery-status callbacks (sent/delivered/read), which
+    carry no user message and can be acknowledged without parsing the body.
+    """
+    return b'"statuses"' in raw and b'"messages"' not in raw
+
+
+def parse_webhook(raw: bytes) -> WebhookEvent:
+    """Decode the raw body once and extract the typed event. Raises ValueError on invalid JSON."""
+    body = _loads(raw)
+    if not isinstance(body, dict):
+        raise ValueError("Webhook body must be a JSON object")
+    return WebhookEvent.from_body(body)
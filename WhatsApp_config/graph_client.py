@@ -0,0 +1,110 @@
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "https://graph.facebook.com"
+
+# Throttling and server-side errors are worth another try, anything else is final
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value):
+    """
+    Convert a Retry-After header (seconds or HTTP date) to seconds, None if absent or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class GraphClient:
+    """
+    Keep-alive client for the WhatsApp Cloud API /messages endpoint.
+
+    One requests.Session with a connection pool sized for the workers is shared
+    by every send, so replies reuse open TCP+TLS connections. Responses 429/5xx
+    and failed connections are retried with jittered exponential backoff,
+    honouring the Retry-After header when the API sends one.
+    """
+
+    def __init__(
+        self,
+        access_token,
+        phone_number_id,
+        version,
+        base_url=DEFAULT_BASE_URL,
+        pool_size=10,
+        timeout=10,
+        max_retries=3,
+        backoff_base=0.5,
+        backoff_max=8.0,
+        retry_after_max=30.0,
+    ):
+        self.messages_url = f"{base_url.rstrip('/')}/{version}/{phone_number_id}/messages"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "Content-type": "application/json",
+                "Authorization": f"Bearer {access_token}",
+            }
+        )
+
+    def _backoff(self, attempt):
+        # "Full jitter": random delay up to the exponential ceiling
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retry_delay(self, response, attempt):
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, self.retry_after_max)
+        return self._backoff(attempt)
+
+    def send(self, data):
+        """
+        POST a JSON message payload and return the response.
+        Raises requests.RequestException once the retries are exhausted.
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.messages_url, data=data, timeout=self.timeout)
+            except requests.ConnectionError as e:
+                # The request never reached the API, so sending again is safe.
+                # Read timeouts are not retried: the message may have gone out.
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"Graph API connection failed ({e}), retrying in {delay:.2f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response
+                delay = self._retry_delay(response, attempt)
+                logging.warning(
+                    f"Graph API answered {response.status_code}, retrying in {delay:.2f}s"
+                )
+            attempt += 1
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
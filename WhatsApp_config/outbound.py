@@ -0,0 +1,268 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, holding at most `burst`.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self.max_wait = 0.0
+        self.acquired = 0
+        self.rejected = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, waited=0.0):
+        """Consume a token; `waited` is how long the caller was held back for it."""
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        self.acquired += 1
+        self.waited += waited
+        self.max_wait = max(self.max_wait, waited)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures; while open nothing is
+    sent. After `reset_timeout` seconds one trial send is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+
+    def retry_in(self):
+        """0 if a send may go out now, else seconds until the next trial."""
+        if self.state == self.CLOSED:
+            return 0.0
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            self.state = self.HALF_OPEN
+        # Half-open: a single trial at a time
+        return self.reset_timeout if self.trial_running else 0.0
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logging.warning("Graph API circuit breaker opened, deferring outbound messages")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+def is_api_failure(error):
+    """Failures that say the API is unhealthy (throttling, 5xx, network), not a bad message."""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, requests.RequestException)
+
+
+class OutboundScheduler:
+    """
+    Paces replies between `get_text_message_input` and the Graph API.
+
+    Messages are queued per recipient and served round-robin, so one chatty
+    user cannot delay everybody else, while each recipient still gets its
+    replies in order. Every PHONE_NUMBER_ID has a token bucket matching its
+    throughput limit, and a circuit breaker defers sends while the API keeps
+    failing. Messages that waited longer than `max_age` are shed.
+    """
+
+    def __init__(
+        self,
+        deliver,
+        rate=80.0,
+        burst=80,
+        senders=4,
+        max_pending=10000,
+        max_age=120.0,
+        breaker=None,
+    ):
+        self.deliver = deliver
+        self.rate = rate
+        self.burst = burst
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.breaker = breaker or CircuitBreaker()
+        self.buckets = {}
+        self._queues = {}  # (phone_number_id, recipient) -> deque of (enqueued_at, data)
+        self._ready = deque()  # recipients with queued messages, in round-robin order
+        self._busy = set()  # recipients with a send in flight
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self.shed = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"immobot-sender-{i}", daemon=True)
+            for i in range(senders)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _bucket(self, phone_number_id):
+        bucket = self.buckets.get(phone_number_id)
+        if bucket is None:
+            bucket = self.buckets[phone_number_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def submit(self, phone_number_id, recipient, data):
+        """Queue a message; returns False if it was rejected because the queue is full."""
+        key = (phone_number_id, recipient)
+        with self._cond:
+            bucket = self._bucket(phone_number_id)
+            if self._closed or self._pending >= self.max_pending:
+                self.rejected += 1
+                bucket.rejected += 1
+                logging.warning(f"Outbound queue full, dropping reply to {recipient}")
+                return False
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+                if key not in self._busy:
+                    self._ready.append(key)
+            queue.append((time.monotonic(), data))
+            self._pending += 1
+            self._cond.notify()
+        return True
+
+    def _next(self):
+        """
+        Wait for a recipient whose message may go out now and pop it.
+        Called with the condition held; returns None on shutdown.
+        """
+        while True:
+            if self._closed and not self._pending:
+                return None
+            wait = None
+            if self._ready:
+                breaker_wait = self.breaker.retry_in()
+                if breaker_wait:
+                    wait = breaker_wait
+                else:
+                    for _ in range(len(self._ready)):
+                        key = self._ready.popleft()
+                        bucket = self._bucket(key[0])
+                        delay = bucket.delay()
+                        if delay:
+                            # This number is out of tokens, give the others a turn
+                            self._ready.append(key)
+                            wait = delay if wait is None else min(wait, delay)
+                            continue
+                        queue = self._queues[key]
+                        enqueued_at, data = queue.popleft()
+                        self._pending -= 1
+                        if not queue:
+                            del self._queues[key]
+                        self._busy.add(key)
+                        waited = time.monotonic() - enqueued_at
+                        if waited > self.max_age:
+                            self.shed += 1
+                            logging.warning(f"Dropping reply to {key[1]} after {waited:.0f}s in queue")
+                            self._release(key)
+                            continue
+                        bucket.take(waited)
+                        if self.breaker.state == CircuitBreaker.HALF_OPEN:
+                            self.breaker.trial_running = True
+                        return key, data
+            self._cond.wait(wait)
+
+    def _release(self, key):
+        self._busy.discard(key)
+        if key in self._queues:
+            # Back of the line: the other recipients get their turn first
+            self._ready.append(key)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job = self._next()
+            if job is None:
+                return
+            key, data = job
+            try:
+                self.deliver(data)
+            except Exception as e:
+                logging.error(f"Failed to send reply to {key[1]}: {e}")
+                with self._cond:
+                    self.failed += 1
+                    if is_api_failure(e):
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+            else:
+                with self._cond:
+                    self.sent += 1
+                    self.breaker.record_success()
+            with self._cond:
+                self._release(key)
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": self._pending,
+                "recipients_waiting": len(self._queues),
+                "sent": self.sent,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "shed": self.shed,
+                "circuit": self.breaker.state,
+                "buckets": {
+                    phone_number_id: {
+                        "sent": bucket.acquired,
+                        "rejected": bucket.rejected,
+                        "avg_wait_seconds": bucket.waited / bucket.acquired if bucket.acquired else 0.0,
+                        "max_wait_seconds": bucket.max_wait,
+                    }
+                    for phone_number_id, bucket in self.buckets.items()
+                },
+            }
+
+    def shutdown(self, timeout=10.0):
+        """Stop accepting messages and let the senders drain the queue."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self._threads)
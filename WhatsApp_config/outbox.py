@@ -0,0 +1,293 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    data TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    -- Nobody else sends the reply before this time: the lease of its current sender
+    claimed_until REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    delivered_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (claimed_until) WHERE state = 'pending';
+CREATE INDEX IF NOT EXISTS outbox_created_at ON outbox (created_at);
+"""
+
+PENDING = "pending"
+DELIVERED = "delivered"
+ABANDONED = "abandoned"
+
+
+class _Waiter:
+    __slots__ = ("event", "result")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class Outbox:
+    """
+    Durable log of outgoing replies in a SQLite WAL file.
+
+    A reply is appended before it is sent and marked delivered once the Graph
+    API accepted it, so a reply computed by a process that dies before sending
+    it is not lost: `OutboxRelay` sends the replies that are still pending
+    after their sender's lease (`lease` seconds) ran out.
+
+    All writes go through one thread that commits whatever accumulated while
+    the previous commit was being synced (group commit): `append` returns once
+    the transaction holding the reply is durable, and a busy server pays one
+    fsync per batch instead of one per reply. Delivery outcomes are queued the
+    same way but nobody waits for them. Reply ids are the primary key, so an
+    id is recorded and marked delivered at most once, whichever process or
+    retry gets there first.
+    """
+
+    def __init__(self, path, lease=300.0, max_attempts=5, retry_delay=5.0, max_age=86400.0, batch_size=500):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._ops = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.appended = 0
+        self.duplicates = 0
+        self.commits = 0
+        self.committed_ops = 0
+        self.connection.executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._run, name="immobot-outbox", daemon=True)
+        self._writer.start()
+
+    @property
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            # A reply acknowledged by append must survive a power loss too
+            conn.execute("PRAGMA synchronous = FULL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _submit(self, op, waiter=None):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("outbox is closed")
+            self._ops.append((op, waiter))
+            self._cond.notify()
+
+    def append(self, reply_id, recipient, data):
+        """
+        Durably record a reply about to be sent, leased to the caller.
+        Returns False if `reply_id` was already recorded: it must not be sent again.
+        """
+        waiter = _Waiter()
+        self._submit(("append", reply_id, recipient, data, time.time()), waiter)
+        waiter.event.wait()
+        if isinstance(waiter.result, Exception):
+            raise waiter.result
+        return waiter.result
+
+    def delivered(self, reply_id):
+        """Record that the Graph API accepted the reply."""
+        self._submit(("delivered", reply_id, time.time()))
+
+    def failed(self, reply_id, error):
+        """
+        Record a failed send: the reply is retried after a backoff, and
+        abandoned after `max_attempts` attempts.
+        """
+        self._submit(("failed", reply_id, str(error), time.time()))
+
+    def _apply(self, conn, op):
+        kind, reply_id = op[0], op[1]
+        if kind == "append":
+            _, _, recipient, data, now = op
+            return conn.execute(
+                "INSERT OR IGNORE INTO outbox (id, recipient, data, state, created_at, claimed_until)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (reply_id, recipient, data, PENDING, now, now + self.lease),
+            ).rowcount == 1
+        if kind == "delivered":
+            conn.execute(
+                "UPDATE outbox SET state = ?, delivered_at = ? WHERE id = ? AND state = ?",
+                (DELIVERED, op[2], reply_id, PENDING),
+            )
+        elif kind == "failed":
+            _, _, error, now = op
+            # Exponential backoff, never longer than a lease
+            conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ?,"
+                " claimed_until = ? + min(?, ? * (1 << attempts)),"
+                " state = CASE WHEN attempts + 1 >= ? THEN ? ELSE state END"
+                " WHERE id = ? AND state = ?",
+                (error, now, self.lease, self.retry_delay, self.max_attempts, ABANDONED, reply_id, PENDING),
+            )
+        return None
+
+    def _run(self):
+        conn = self.connection
+        while True:
+            with self._cond:
+                while not self._ops and not self._closed:
+                    self._cond.wait()
+                if not self._ops:
+                    return
+                batch = [self._ops.popleft() for _ in range(min(len(self._ops), self.batch_size))]
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    results = [self._apply(conn, op) for op, _ in batch]
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                logging.error(f"Outbox commit of {len(batch)} operations failed: {e}")
+                results = [e] * len(batch)
+            else:
+                with self._cond:
+                    self.commits += 1
+                    self.committed_ops += len(batch)
+                    for (op, _), result in zip(batch, results):
+                        if op[0] == "append":
+                            if result:
+                                self.appended += 1
+                            else:
+                                self.duplicates += 1
+            for (_, waiter), result in zip(batch, results):
+                if waiter is not None:
+                    waiter.result = result
+                    waiter.event.set()
+
+    def claim_due(self, limit=100):
+        """
+        Pending replies whose lease expired, oldest first, now leased to the
+        caller. Replies older than `max_age` are abandoned instead: WhatsApp
+        refuses free-form replies once the conversation window closed.
+        """
+        now = time.time()
+        conn = self.connection
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE outbox SET state = ?, last_error = coalesce(last_error, 'expired')"
+                " WHERE state = ? AND claimed_until <= ? AND created_at < ?",
+                (ABANDONED, PENDING, now, now - self.max_age),
+            )
+            rows = conn.execute(
+                "SELECT id, recipient, data FROM outbox WHERE state = ? AND claimed_until <= ?"
+                " ORDER BY created_at LIMIT ?",
+                (PENDING, now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET claimed_until = ? WHERE id = ?", [(now + self.lease, row[0]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def purge(self, older_than):
+        """Forget delivered and abandoned replies created more than `older_than` seconds ago."""
+        return self.connection.execute(
+            "DELETE FROM outbox WHERE state != ? AND created_at < ?", (PENDING, time.time() - older_than)
+        ).rowcount
+
+    def close(self, timeout=10.0):
+        """Commit what is queued and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._writer.join(timeout)
+
+    def stats(self):
+        counts = dict(self.connection.execute("SELECT state, count(*) FROM outbox GROUP BY state").fetchall())
+        with self._cond:
+            return {
+                "pending": counts.get(PENDING, 0),
+                "delivered": counts.get(DELIVERED, 0),
+                "abandoned": counts.get(ABANDONED, 0),
+                "appended": self.appended,
+                "duplicates": self.duplicates,
+                "queued_writes": len(self._ops),
+                "commits": self.commits,
+                "avg_writes_per_commit": self.committed_ops / self.commits if self.commits else 0.0,
+            }
+
+
+class OutboxRelay:
+    """
+    Background thread sending the replies the outbox still holds: right away
+    (replies a previous process computed but never sent), then every
+    `interval` seconds (failed sends, and replies of a worker that died).
+    `send(reply_id, recipient, data)` sends one reply and records its outcome.
+    """
+
+    # Delivered and abandoned replies are purged once every this many polls
+    PURGE_EVERY = 60
+
+    def __init__(self, outbox, send, interval=5.0, batch_size=100):
+        self.outbox = outbox
+        self.send = send
+        self.interval = interval
+        self.batch_size = batch_size
+        self.replayed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        """Send every reply that is due now; returns how many were handed to `send`."""
+        count = 0
+        while True:
+            rows = self.outbox.claim_due(self.batch_size)
+            for reply_id, recipient, data in rows:
+                logging.info(f"Replaying reply {reply_id} to {recipient} from the outbox")
+                try:
+                    self.send(reply_id, recipient, data)
+                except Exception:
+                    logging.exception(f"Replaying reply {reply_id} failed")
+            count += len(rows)
+            if len(rows) < self.batch_size:
+                break
+        self.replayed += count
+        return count
+
+    def _run(self):
+        polls = 0
+        while True:
+            try:
+                self.run_once()
+                polls += 1
+                if polls % self.PURGE_EVERY == 0:
+                    self.outbox.purge(self.outbox.max_age)
+            except sqlite3.Error as e:
+                logging.error(f"Outbox relay failed, retrying in {self.interval}s: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="immobot-outbox-relay", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
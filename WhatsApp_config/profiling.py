@@ -0,0 +1,100 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, request
+
+from immobot_config.metrics import stage_breakdown
+from WhatsApp_config.delivery import mask_number
+from WhatsApp_config.whatsapp_resp import get_session_store
+
+# cProfile cannot run twice at once (on Python 3.12+ not even in two threads),
+# so only one request is profiled at a time; the others run unprofiled
+_profiling = threading.Lock()
+
+
+def _session_snapshots(store, event):
+    # Reports are diagnostics that get shared around: phone numbers are masked
+    snapshots = {}
+    for message in getattr(event, "messages", ()):
+        if message.wa_id not in snapshots:
+            session = store.peek(message.wa_id)
+            snapshot = session.to_dict() if session is not None else {"wa_id": message.wa_id}
+            snapshot["wa_id"] = mask_number(message.wa_id)
+            snapshots[message.wa_id] = snapshot
+    return list(snapshots.values())
+
+
+def _rotate(directory, keep):
+    profiles = sorted(name for name in os.listdir(directory) if name.endswith(".prof"))
+    for name in profiles[:max(0, len(profiles) - keep)]:
+        for path in (name, name[:-len(".prof")] + ".json"):
+            try:
+                os.remove(os.path.join(directory, path))
+            except FileNotFoundError:
+                pass
+
+
+def _dump(profiler, elapsed, stages, response, config):
+    directory = config["PROFILE_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{time.time_ns() % 10**9:09d}-{elapsed * 1000:.0f}ms")
+    profiler.dump_stats(base + ".prof")
+    event = g.get("webhook_event")
+    status = response[1] if isinstance(response, tuple) and len(response) > 1 else getattr(response, "status_code", 200)
+    report = {
+        "path": request.path,
+        "status": status,
+        "elapsed_ms": elapsed * 1000,
+        "threshold_ms": config["PROFILE_THRESHOLD_MS"],
+        "stages_ms": {stage: seconds * 1000 for stage, seconds in sorted(stages.items())},
+        "message_ids": [message.id for message in getattr(event, "messages", ())],
+        "sessions": _session_snapshots(get_session_store(config), event) if event is not None else [],
+        "profile": os.path.basename(base + ".prof"),
+    }
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    _rotate(directory, config["PROFILE_MAX_FILES"])
+    logging.warning(f"Slow webhook request ({elapsed * 1000:.0f}ms), profile written to {base}.prof")
+
+
+def profiled(f):
+    """
+    Run cProfile on a PROFILE_SAMPLE_RATE fraction of requests and, when one
+    takes longer than PROFILE_THRESHOLD_MS, write its profile (.prof, for
+    pstats or snakeviz) and a JSON report with the per-stage timings and the
+    conversation state to PROFILE_DIR, keeping the newest PROFILE_MAX_FILES.
+    Requests that are not sampled only pay for one random() call.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        config = current_app.config
+        rate = config["PROFILE_SAMPLE_RATE"]
+        if not rate or random.random() >= rate or not _profiling.acquire(blocking=False):
+            return f(*args, **kwargs)
+        try:
+            profiler = cProfile.Profile()
+            with stage_breakdown() as stages:
+                start = time.perf_counter()
+                profiler.enable()
+                try:
+                    response = f(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                elapsed = time.perf_counter() - start
+            if elapsed * 1000 >= config["PROFILE_THRESHOLD_MS"]:
+                try:
+                    _dump(profiler, elapsed, stages, response, config)
+                except OSError as e:
+                    logging.error(f"Could not write request profile: {e}")
+            return response
+        finally:
+            _profiling.release()
+
+    return decorated_function
@@ -1,20 +1,31 @@
-from functools import wraps
+from functools import lru_cache, wraps
 from flask import current_app, jsonify, request
 import logging
 import hashlib
 import hmac
 
+from immobot_config.metrics import timed
 
-def validate_signature(payload, signature):
+
+@lru_cache(maxsize=4)
+def _signer(app_secret):
+    # Keyed HMAC state built once per secret; each request works on a copy
+    return hmac.new(bytes(app_secret, "latin-1"), digestmod=hashlib.sha256)
+
+
+def validate_signature(payload, signature, app_secret=None):
     """
-    Validate the incoming payload's signature against our expected signature
+    Validate the incoming payload's signature against our expected signature.
+    `payload` is the raw request body (str is accepted and encoded as UTF-8).
     """
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    if app_secret is None:
+        app_secret = current_app.config["APP_SECRET"]
     # Use the App Secret to hash the payload
-    expected_signature = hmac.new(
-        bytes(current_app.config["APP_SECRET"], "latin-1"),
-        msg=payload.encode("utf-8"),
-        digestmod=hashlib.sha256,
-    ).hexdigest()
+    mac = _signer(app_secret).copy()
+    mac.update(payload)
+    expected_signature = mac.hexdigest()
 
     # Check if the signature matches
     return hmac.compare_digest(expected_signature, signature)
@@ -30,7 +41,10 @@ def signature_required(f):
         signature = request.headers.get("X-Hub-Signature-256", "")[
             7:
         ]  # Removing 'sha256='
-        if not validate_signature(request.data.decode("utf-8"), signature):
+        # HMAC over the raw bytes; the body stays cached for the handler
+        with timed("signature"):
+            valid = validate_signature(request.get_data(cache=True), signature)
+        if not valid:
             logging.info("Signature verification failed!")
             return jsonify({"status": "error", "message": "Invalid signature"}), 403
         return f(*args, **kwargs)
@@ -2,11 +2,200 @@ import logging
 from flask import current_app, jsonify
 import json
 import requests
+import os
+import threading
+import time
 
 from immobot_config.immo_resp import immoBot
+from immobot_config.session import SessionConflict, SessionStore, SqliteSessionStore
+from immobot_config.catalog_watcher import CatalogWatcher
+from WhatsApp_config.dispatcher import MessageDispatcher
+from WhatsApp_config.graph_client import GraphClient
+from WhatsApp_config.outbound import CircuitBreaker, OutboundScheduler
+from WhatsApp_config.dedupe import MessageDeduper, SqliteDeduper
+from WhatsApp_config.outbox import Outbox, OutboxRelay
+from WhatsApp_config.delivery import DeliveryTracker
+from WhatsApp_config.events import WebhookEvent
+from immobot_config.metrics import ERRORS, SENDS, timed
+import atexit
 import re
+import sqlite3
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+_dialogue_manager = None
+_dialogue_manager_lock = threading.Lock()
+_catalog_watcher = None
+_catalog_watcher_config = None
+
+
+def _reset_after_fork():
+    """
+    Threads and sockets do not survive fork(): a forked worker starts its own
+    watcher, pools and clients on first use. The catalog and the dialogue
+    manager stay shared copy-on-write.
+    """
+    global _catalog_watcher, _session_store, _dispatcher, _graph_client
+    global _outbound_scheduler, _deduper, _batch_executor, _outbox, _delivery_tracker
+    global _dialogue_manager_lock, _session_store_lock, _dispatcher_lock, _graph_client_lock
+    global _outbound_scheduler_lock, _deduper_lock, _batch_executor_lock, _outbox_lock
+    global _delivery_tracker_lock
+    _catalog_watcher = _dispatcher = _graph_client = None
+    _outbound_scheduler = _batch_executor = _outbox = _delivery_tracker = None
+    # SQLite-backed stores reconnect per process by themselves
+    if not isinstance(_session_store, SqliteSessionStore):
+        _session_store = None
+    if not isinstance(_deduper, SqliteDeduper):
+        _deduper = None
+    _dialogue_manager_lock = threading.Lock()
+    _session_store_lock = threading.Lock()
+    _dispatcher_lock = threading.Lock()
+    _graph_client_lock = threading.Lock()
+    _outbound_scheduler_lock = threading.Lock()
+    _deduper_lock = threading.Lock()
+    _batch_executor_lock = threading.Lock()
+    _outbox_lock = threading.Lock()
+    _delivery_tracker_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_dialogue_manager(start_watcher=True):
+    """
+    One dialogue manager (shared database + language manager) for every user,
+    the per-user conversation state lives in the session store. Loading the
+    catalog is the slowest part of startup, so it happens on the first
+    message: until then the server already answers webhook verifications.
+    The catalog watcher recorded by start_catalog_watcher starts with it,
+    unless `start_watcher` is False (a pre-fork parent serves no catalog).
+    """
+    global _dialogue_manager
+    if _dialogue_manager is None:
+        with _dialogue_manager_lock:
+            if _dialogue_manager is None:
+                start = time.perf_counter()
+                manager = immoBot()
+                logging.info(f"Dialogue manager ready in {(time.perf_counter() - start) * 1000:.0f}ms")
+                _dialogue_manager = manager
+                if start_watcher and _catalog_watcher_config is not None:
+                    start_catalog_watcher(_catalog_watcher_config)
+    return _dialogue_manager
+
+
+def start_catalog_watcher(config):
+    """
+    Poll the catalog file for changes, unless CATALOG_RELOAD_INTERVAL is 0.
+    Before the catalog is loaded this only records the setting, and the
+    watcher starts together with the dialogue manager.
+    """
+    global _catalog_watcher, _catalog_watcher_config
+    if config["CATALOG_RELOAD_INTERVAL"] <= 0:
+        return None
+    if _dialogue_manager is None:
+        _catalog_watcher_config = config
+        return None
+    if _catalog_watcher is None:
+        _catalog_watcher = CatalogWatcher(
+            _dialogue_manager.database,
+            interval=config["CATALOG_RELOAD_INTERVAL"],
+            use_hash=config["CATALOG_RELOAD_HASH"],
+        ).start()
+    return _catalog_watcher
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store(config=None):
+    """
+    Return the process-wide session store, created on first use from the app config:
+    in memory, or in the SQLite file named by SESSION_SQLITE_PATH, shared by worker processes.
+    """
+    global _session_store
+    if _session_store is None:
+        with _session_store_lock:
+            if _session_store is None:
+                config = config if config is not None else current_app.config
+                if config["SESSION_SQLITE_PATH"]:
+                    _session_store = SqliteSessionStore(
+                        config["SESSION_SQLITE_PATH"], ttl=config["SESSION_TTL_SECONDS"]
+                    )
+                else:
+                    _session_store = SessionStore(
+                        max_sessions=config["SESSION_MAX_COUNT"],
+                        ttl=config["SESSION_TTL_SECONDS"],
+                    )
+    return _session_store
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """
+    Return the background worker pool, started on first use from the app config.
+    The pool is drained when the process exits.
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                config = current_app.config
+                _dispatcher = MessageDispatcher(
+                    current_app._get_current_object(),
+                    workers=config["WORKER_COUNT"],
+                    queue_size=config["WORKER_QUEUE_SIZE"],
+                )
+                atexit.register(_dispatcher.shutdown, config["WORKER_DRAIN_TIMEOUT"])
+    return _dispatcher
+
+
+def generate_reply(wa_id, message_body, config=None):
+    """
+    Run one message through the dialogue manager using the conversation of `wa_id`.
+    With a shared session store another worker may update the conversation
+    meanwhile: the message is then processed again against the new state.
+    """
+    config = config if config is not None else current_app.config
+    store = get_session_store(config)
+    attempts = config["SESSION_CONFLICT_RETRIES"] + 1
+    for attempt in range(attempts):
+        try:
+            with store.session(wa_id) as session:
+                return get_dialogue_manager().process_message(message_body, session)
+        except SessionConflict:
+            if attempt + 1 == attempts:
+                raise
+            logging.info(f"Session of {wa_id} changed concurrently, retrying")
+
+
+_graph_client = None
+_graph_client_lock = threading.Lock()
+
+
+def get_graph_client(config=None):
+    """
+    Return the shared keep-alive Graph API client, created on first use from the app config.
+    """
+    global _graph_client
+    if _graph_client is None:
+        with _graph_client_lock:
+            if _graph_client is None:
+                config = config if config is not None else current_app.config
+                _graph_client = GraphClient(
+                    access_token=config["ACCESS_TOKEN"],
+                    phone_number_id=config["PHONE_NUMBER_ID"],
+                    version=config["VERSION"],
+                    base_url=config["GRAPH_API_BASE_URL"],
+                    pool_size=config["GRAPH_POOL_SIZE"],
+                    timeout=config["GRAPH_TIMEOUT"],
+                    max_retries=config["GRAPH_MAX_RETRIES"],
+                )
+    return _graph_client
 
-dialogue_manager = immoBot()
 
 def log_http_response(response):
     logging.info(f"Status: {response.status_code}")
@@ -27,32 +216,216 @@ def get_text_message_input(recipient, text):
 
 
 def send_message(data):
-    headers = {
-        "Content-type": "application/json",
-        "Authorization": f"Bearer {current_app.config['ACCESS_TOKEN']}",
-    }
-
-    url = f"https://graph.facebook.com/{current_app.config['VERSION']}/{current_app.config['PHONE_NUMBER_ID']}/messages"
-
     try:
-        response = requests.post(
-            url, data=data, headers=headers, timeout=10
-        )  # 10 seconds timeout as an example
-        response.raise_for_status()  # Raises an HTTPError if the HTTP request returned an unsuccessful status code
+        # Pooled connection, retries throttling/5xx and raises once they are exhausted
+        with timed("send"):
+            response = get_graph_client().send(data)
     except requests.Timeout:
+        SENDS.labels("error").inc()
         logging.error("Timeout occurred while sending message")
         return jsonify({"status": "error", "message": "Request timed out"}), 408
     except (
         requests.RequestException
     ) as e:  # This will catch any general request exception
+        SENDS.labels("error").inc()
         logging.error(f"Request failed due to: {e}")
         return jsonify({"status": "error", "message": "Failed to send message"}), 500
     else:
         # Process the response as normal
+        SENDS.labels("ok").inc()
         log_http_response(response)
         return response
 
 
+_outbound_scheduler = None
+_outbound_scheduler_lock = threading.Lock()
+
+
+def get_outbound_scheduler(config=None):
+    """
+    Return the outbound scheduler, started on first use from the app config.
+    Queued replies are drained when the process exits.
+    """
+    global _outbound_scheduler
+    if _outbound_scheduler is None:
+        with _outbound_scheduler_lock:
+            if _outbound_scheduler is None:
+                config = config if config is not None else current_app.config
+
+                def deliver(item):
+                    # Raises on failure so the scheduler's circuit breaker sees it
+                    reply_id, data = item
+                    deliver_reply(reply_id, data, config)
+
+                _outbound_scheduler = OutboundScheduler(
+                    deliver,
+                    rate=config["OUTBOUND_RATE"],
+                    burst=config["OUTBOUND_BURST"],
+                    senders=config["GRAPH_POOL_SIZE"],
+                    max_pending=config["OUTBOUND_MAX_PENDING"],
+                    max_age=config["OUTBOUND_MAX_AGE"],
+                    breaker=CircuitBreaker(
+                        failure_threshold=config["OUTBOUND_BREAKER_FAILURES"],
+                        reset_timeout=config["OUTBOUND_BREAKER_RESET"],
+                    ),
+                )
+                atexit.register(_outbound_scheduler.shutdown, config["WORKER_DRAIN_TIMEOUT"])
+    return _outbound_scheduler
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox(config=None):
+    """
+    Return the durable reply outbox, or None when OUTBOX_SQLITE_PATH is empty.
+    Its relay starts with it and first sends what earlier processes left
+    undelivered.
+    """
+    global _outbox
+    config = config if config is not None else current_app.config
+    if _outbox is None and config["OUTBOX_SQLITE_PATH"]:
+        with _outbox_lock:
+            if _outbox is None:
+                outbox = Outbox(
+                    config["OUTBOX_SQLITE_PATH"],
+                    lease=config["OUTBOX_LEASE_SECONDS"],
+                    max_attempts=config["OUTBOX_MAX_ATTEMPTS"],
+                    retry_delay=config["OUTBOX_RETRY_DELAY"],
+                    max_age=config["OUTBOX_MAX_AGE"],
+                )
+                _outbox = outbox
+                relay = OutboxRelay(
+                    outbox,
+                    lambda reply_id, recipient, data: send_reply(recipient, data, config, reply_id),
+                    interval=config["OUTBOX_RELAY_INTERVAL"],
+                ).start()
+                # atexit runs these last-registered-first: stop replaying, then flush the outcomes
+                atexit.register(outbox.close, config["WORKER_DRAIN_TIMEOUT"])
+                atexit.register(relay.stop)
+    return _outbox
+
+
+def deliver_reply(reply_id, data, config=None):
+    """
+    Send one reply through the Graph API client, raising on failure, and
+    record the outcome of `reply_id` (None when it is not in the outbox).
+    """
+    config = config if config is not None else current_app.config
+    outbox = get_outbox(config) if reply_id is not None else None
+    try:
+        with timed("send"):
+            response = get_graph_client(config).send(data)
+    except Exception as e:
+        SENDS.labels("error").inc()
+        if outbox is not None:
+            outbox.failed(reply_id, e)
+        raise
+    SENDS.labels("ok").inc()
+    log_http_response(response)
+    if outbox is not None:
+        outbox.delivered(reply_id)
+    return response
+
+
+def record_reply(recipient, data, config=None, reply_id=None):
+    """
+    Make a reply durable in the outbox before it is sent. Returns (send,
+    reply_id): `send` is False when `reply_id` was recorded before (it was
+    sent, or the relay will send it), and `reply_id` is None when the reply
+    is not in the outbox (none configured, or it could not be written: the
+    reply then still goes out, just without a second chance).
+    """
+    config = config if config is not None else current_app.config
+    outbox = get_outbox(config)
+    if outbox is None:
+        return True, None
+    reply_id = reply_id or uuid.uuid4().hex
+    try:
+        if not outbox.append(reply_id, recipient, data):
+            logging.info(f"Reply {reply_id} is already in the outbox, not sending it again")
+            return False, reply_id
+    except (sqlite3.Error, RuntimeError) as e:
+        logging.error(f"Could not write reply {reply_id} to the outbox, sending it anyway: {e}")
+        return True, None
+    return True, reply_id
+
+
+def send_reply(recipient, data, config=None, reply_id=None):
+    """
+    Send a reply now, or hand it to the rate-limited scheduler when
+    OUTBOUND_SCHEDULER is on; the outcome of `reply_id` goes to the outbox.
+    """
+    config = config if config is not None else current_app.config
+    if config["OUTBOUND_SCHEDULER"]:
+        if get_outbound_scheduler(config).submit(config["PHONE_NUMBER_ID"], recipient, (reply_id, data)):
+            return
+        # Rejected because the queue is full: only an outbox reply gets another chance
+        if reply_id is None:
+            ERRORS.labels("outbound").inc()
+            logging.warning(f"Reply to {recipient} dropped: the outbound queue is full")
+        else:
+            logging.warning(f"Outbound queue full, the outbox will retry reply {reply_id} to {recipient}")
+    elif reply_id is None:
+        send_message(data)
+    else:
+        try:
+            deliver_reply(reply_id, data, config)
+        except Exception as e:
+            logging.error(f"Failed to send reply {reply_id} to {recipient}, the outbox will retry it: {e}")
+
+
+def dispatch_reply(recipient, data, config=None, reply_id=None):
+    """
+    Record a reply in the outbox (when OUTBOX_SQLITE_PATH is set), then send it.
+    `reply_id` identifies the reply across retries and processes: the id of
+    the message it answers, so a reply is never recorded or sent twice.
+    """
+    config = config if config is not None else current_app.config
+    send, reply_id = record_reply(recipient, data, config, reply_id)
+    if send:
+        send_reply(recipient, data, config, reply_id)
+
+
+_delivery_tracker = None
+_delivery_tracker_lock = threading.Lock()
+
+
+def get_delivery_tracker(config=None):
+    """
+    Return the delivery status store, or None when DELIVERY_SQLITE_PATH is empty.
+    What is still buffered is written when the process exits.
+    """
+    global _delivery_tracker
+    config = config if config is not None else current_app.config
+    if _delivery_tracker is None and config["DELIVERY_SQLITE_PATH"]:
+        with _delivery_tracker_lock:
+            if _delivery_tracker is None:
+                _delivery_tracker = DeliveryTracker(
+                    config["DELIVERY_SQLITE_PATH"],
+                    flush_interval=config["DELIVERY_FLUSH_INTERVAL"],
+                    batch_size=config["DELIVERY_BATCH_SIZE"],
+                    max_buffered=config["DELIVERY_MAX_BUFFERED"],
+                    retention=config["DELIVERY_RETENTION_SECONDS"],
+                )
+                atexit.register(_delivery_tracker.close, config["WORKER_DRAIN_TIMEOUT"])
+    return _delivery_tracker
+
+
+def track_statuses(payload, config=None):
+    """
+    Hand delivery statuses to the tracker: the raw body of a status-only
+    webhook (parsed later, off the request path) or the statuses of a parsed
+    WebhookEvent. Without a tracker they are only logged.
+    """
+    tracker = get_delivery_tracker(config)
+    if tracker is None:
+        logging.info("Received a WhatsApp status update.")
+    else:
+        tracker.add(payload)
+
+
 def process_text_for_whatsapp(text):
     # Remove brackets
     pattern = r"\【.*?\】"
@@ -72,29 +445,129 @@ def process_text_for_whatsapp(text):
 
 # very important function to process the whatsapp message
 
-def process_whatsapp_message(body):
-    wa_id = body["entry"][0]["changes"][0]["value"]["contacts"][0]["wa_id"]
-    name = body["entry"][0]["changes"][0]["value"]["contacts"][0]["profile"]["name"]
+def as_webhook_event(body):
+    """Accept either a parsed WebhookEvent or a decoded JSON body."""
+    return body if isinstance(body, WebhookEvent) else WebhookEvent.from_body(body)
 
-    message = body["entry"][0]["changes"][0]["value"]["messages"][0]
-    message_body = message["text"]["body"]
 
-    # Process the message with the dialogue manager
-    
-    response = dialogue_manager.process_message(message_body)
-    data = get_text_message_input(current_app.config["RECIPIENT_WAID"], response)
-    send_message(data)
+def iter_whatsapp_messages(body):
+    """
+    Yield (wa_id, message) for every message of every change of every entry:
+    Meta may batch several of each into one webhook delivery.
+    """
+    for message in as_webhook_event(body).messages:
+        yield message.wa_id, message
+
+
+def group_messages_by_user(body):
+    """Messages of the delivery grouped by sender, each user's in arrival order."""
+    groups = {}
+    for wa_id, message in iter_whatsapp_messages(body):
+        groups.setdefault(wa_id, []).append(message)
+    return groups
+
+
+def enqueue_whatsapp_message(body):
+    """
+    Hand each sender's messages to the background workers, keyed by wa_id
+    so each user's messages stay in order. Returns False when the queue is full.
+    """
+    dispatcher = get_dispatcher()
+    accepted = True
+    for wa_id, messages in group_messages_by_user(body).items():
+        accepted &= dispatcher.submit(wa_id, process_user_messages, wa_id, messages)
+    return accepted
+
+
+_deduper = None
+_deduper_lock = threading.Lock()
+
+
+def get_deduper(config=None):
+    """
+    Return the message-id dedupe set: in memory, or in the shared SQLite
+    file named by DEDUPE_SQLITE_PATH for multi-process deployments.
+    """
+    global _deduper
+    if _deduper is None:
+        with _deduper_lock:
+            if _deduper is None:
+                config = config if config is not None else current_app.config
+                if config["DEDUPE_SQLITE_PATH"]:
+                    _deduper = SqliteDeduper(config["DEDUPE_SQLITE_PATH"], ttl=config["DEDUPE_TTL_SECONDS"])
+                else:
+                    _deduper = MessageDeduper(
+                        max_entries=config["DEDUPE_MAX_ENTRIES"], ttl=config["DEDUPE_TTL_SECONDS"]
+                    )
+    return _deduper
+
+
+def process_user_messages(wa_id, messages):
+    """Answer one user's messages (InboundMessage objects) in order."""
+    deduper = get_deduper()
+    for message in messages:
+        # Meta redelivers events we answered slowly: never run the same message twice
+        if message.id and not deduper.first_seen(message.id):
+            logging.info(f"Ignoring redelivered message {message.id}")
+            continue
+        if message.text is None:
+            logging.info(f"Ignoring {message.type} message from {wa_id}")
+            continue
+
+        try:
+            # Process the message with the dialogue manager, in this user's conversation
+            response = generate_reply(wa_id, message.text)
+            data = get_text_message_input(wa_id, response)
+            dispatch_reply(wa_id, data, reply_id=message.id)
+        except Exception:
+            # Not answered: Meta's redelivery of this message must not be dropped
+            if message.id:
+                deduper.forget(message.id)
+            raise
+
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+
+def get_batch_executor():
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(
+                    max_workers=current_app.config["WORKER_COUNT"], thread_name_prefix="immobot-batch"
+                )
+    return _batch_executor
+
+
+def _run_in_app_context(app, func, *args):
+    with app.app_context():
+        return func(*args)
+
+
+def process_whatsapp_message(body):
+    """
+    Answer every message of a webhook delivery: users are processed
+    concurrently, the messages of one user sequentially.
+    """
+    groups = group_messages_by_user(body)
+    if len(groups) <= 1:
+        for wa_id, messages in groups.items():
+            process_user_messages(wa_id, messages)
+        return
+    app = current_app._get_current_object()
+    executor = get_batch_executor()
+    futures = [
+        executor.submit(_run_in_app_context, app, process_user_messages, wa_id, messages)
+        for wa_id, messages in groups.items()
+    ]
+    for future in futures:
+        future.result()
 
 
 def is_valid_whatsapp_message(body):
     """
-    Check if the incoming webhook event has a valid WhatsApp message structure.
+    Check if the incoming webhook event has at least one WhatsApp message.
     """
-    return (
-        body.get("object")
-        and body.get("entry")
-        and body["entry"][0].get("changes")
-        and body["entry"][0]["changes"][0].get("value")
-        and body["entry"][0]["changes"][0]["value"].get("messages")
-        and body["entry"][0]["changes"][0]["value"]["messages"][0]
-    )
\ No newline at end of file
+    return as_webhook_event(body).is_whatsapp_message()
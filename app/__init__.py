@@ -1,9 +1,14 @@
+import logging
+import time
+
 from flask import Flask
 from app.config import load_configurations, configure_logging
 from app.views import webhook_blueprint
+from WhatsApp_config.whatsapp_resp import start_catalog_watcher
 
 
 def create_app():
+    start = time.perf_counter()
     app = Flask(__name__)
 
     # Load configurations and logging settings
@@ -13,4 +18,9 @@ def create_app():
     # Import and register blueprints, if any
     app.register_blueprint(webhook_blueprint)
 
+    # Pick up catalog changes without restarting
+    start_catalog_watcher(app.config)
+
+    # The catalog itself is loaded on the first message, see get_dialogue_manager
+    logging.info(f"App created in {(time.perf_counter() - start) * 1000:.0f}ms")
     return app
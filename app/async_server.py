@@ -0,0 +1,305 @@
+import asyncio
+import logging
+
+from aiohttp import web
+
+from app.config import read_configuration, configure_logging
+from WhatsApp_config.async_graph_client import AsyncGraphClient
+from WhatsApp_config.events import is_status_only, parse_webhook
+from WhatsApp_config.delivery import masked_recipients
+from WhatsApp_config.outbound import TokenBucket
+from WhatsApp_config.security.sec_webhook import validate_signature
+from immobot_config.metrics import CONTENT_TYPE, REGISTRY, SENDS, timed
+from WhatsApp_config.whatsapp_resp import (
+    generate_reply,
+    get_deduper,
+    get_delivery_tracker,
+    get_dialogue_manager,
+    get_outbox,
+    get_session_store,
+    get_text_message_input,
+    group_messages_by_user,
+    record_reply,
+    start_catalog_watcher,
+    track_statuses,
+)
+
+CONFIG = web.AppKey("config", dict)
+GRAPH_CLIENT = web.AppKey("graph_client", AsyncGraphClient)
+TASKS = web.AppKey("tasks", set)
+USER_LOCKS = web.AppKey("user_locks", dict)
+OUTBOUND_BUCKET = web.AppKey("outbound_bucket", TokenBucket)
+CATALOG_READY = web.AppKey("catalog_ready", asyncio.Future)
+
+
+def _json(payload, status=200):
+    return web.json_response(payload, status=status)
+
+
+async def _paced(app):
+    """Wait for a token of the PHONE_NUMBER_ID bucket when OUTBOUND_SCHEDULER is on."""
+    bucket = app.get(OUTBOUND_BUCKET)
+    if bucket is None:
+        return
+    waited = 0.0
+    delay = bucket.delay()
+    while delay:
+        await asyncio.sleep(delay)
+        waited += delay
+        delay = bucket.delay()
+    bucket.take(waited)
+
+
+def _does_io(config):
+    """
+    True when dedupe, sessions or the catalog search read and write SQLite
+    files (with busy timeouts): the event loop must not wait on those.
+    """
+    return bool(
+        config["DEDUPE_SQLITE_PATH"]
+        or config["SESSION_SQLITE_PATH"]
+        or get_dialogue_manager().database.backend == "sqlite"
+    )
+
+
+async def _run(blocking, func, *args):
+    """`func(*args)`, in the default executor when it may block on I/O."""
+    if not blocking:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def process_user_messages(app, wa_id, messages):
+    """
+    Answer one user's messages in order. Replies are generated by the shared
+    immoBot and sent over the shared async session. With in-memory stores
+    and catalog, generating a reply does no I/O and runs in the event loop;
+    otherwise dedupe and reply generation run in the default executor.
+    """
+    config = app[CONFIG]
+    locks = app[USER_LOCKS]
+    # One lock per user with work in flight: later deliveries wait their turn
+    entry = locks.setdefault(wa_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            # Never block the event loop on the catalog: wait for the background load
+            await app[CATALOG_READY]
+            blocking = _does_io(config)
+            deduper = get_deduper(config)
+            for message in messages:
+                if message.id and not await _run(blocking, deduper.first_seen, message.id):
+                    logging.info(f"Ignoring redelivered message {message.id}")
+                    continue
+                if message.text is None:
+                    logging.info(f"Ignoring {message.type} message from {wa_id}")
+                    continue
+                try:
+                    response = await _run(blocking, generate_reply, wa_id, message.text, config)
+                    data = get_text_message_input(wa_id, response)
+                    outbox = get_outbox(config)
+                    reply_id = None
+                    if outbox is not None:
+                        # The append waits for a group commit: not on the event loop
+                        send, reply_id = await asyncio.get_running_loop().run_in_executor(
+                            None, record_reply, wa_id, data, config, message.id
+                        )
+                except Exception:
+                    # Not answered: Meta's redelivery of this message must not be dropped
+                    if message.id:
+                        await _run(blocking, deduper.forget, message.id)
+                    raise
+                if outbox is not None and not send:
+                    continue
+                await _paced(app)
+                try:
+                    with timed("send"):
+                        status, body = await app[GRAPH_CLIENT].send(data)
+                except Exception as e:
+                    SENDS.labels("error").inc()
+                    logging.error(f"Failed to send reply to {wa_id}: {e}")
+                    if reply_id is not None:
+                        outbox.failed(reply_id, e)
+                else:
+                    SENDS.labels("ok").inc()
+                    logging.info(f"Status: {status}")
+                    logging.info(f"Body: {body}")
+                    if reply_id is not None:
+                        outbox.delivered(reply_id)
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del locks[wa_id]
+
+
+async def webhook_get(request):
+    # Same verification handshake as app.views.verify
+    config = request.app[CONFIG]
+    mode = request.query.get("hub.mode")
+    token = request.query.get("hub.verify_token")
+    challenge = request.query.get("hub.challenge")
+    if mode and token:
+        if mode == "subscribe" and token == config["VERIFY_TOKEN"]:
+            logging.info("WEBHOOK_VERIFIED")
+            return web.Response(text=challenge or "")
+        logging.info("VERIFICATION_FAILED")
+        return _json({"status": "error", "message": "Verification failed"}, 403)
+    logging.info("MISSING_PARAMETER")
+    return _json({"status": "error", "message": "Missing parameters"}, 400)
+
+
+async def webhook_post(request):
+    with timed("total"):
+        return await _handle_post(request)
+
+
+async def _handle_post(request):
+    app = request.app
+    config = app[CONFIG]
+    raw = await request.read()
+    signature = request.headers.get("X-Hub-Signature-256", "")[7:]  # Removing 'sha256='
+    with timed("signature"):
+        valid = validate_signature(raw, signature, config["APP_SECRET"])
+    if not valid:
+        logging.info("Signature verification failed!")
+        return _json({"status": "error", "message": "Invalid signature"}, 403)
+
+    if is_status_only(raw):
+        track_statuses(raw, config)
+        return _json({"status": "ok"})
+    try:
+        with timed("parse"):
+            event = parse_webhook(raw)
+    except ValueError:
+        logging.error("Failed to decode JSON")
+        return _json({"status": "error", "message": "Invalid JSON provided"}, 400)
+    if event.statuses:
+        track_statuses(event.statuses, config)
+    if not event.is_whatsapp_message():
+        if event.statuses:
+            return _json({"status": "ok"})
+        return _json({"status": "error", "message": "Not a WhatsApp API event"}, 404)
+
+    jobs = [
+        process_user_messages(app, wa_id, messages)
+        for wa_id, messages in group_messages_by_user(event).items()
+    ]
+    if not config["ASYNC_WEBHOOK"]:
+        await asyncio.gather(*jobs)
+        return _json({"status": "ok"})
+
+    # Acknowledge right away; WORKER_QUEUE_SIZE bounds the conversations in flight
+    tasks = app[TASKS]
+    if len(tasks) + len(jobs) > config["WORKER_QUEUE_SIZE"]:
+        for job in jobs:
+            job.close()
+        return _json({"status": "error", "message": "Server busy"}, 503)
+    for job in jobs:
+        task = asyncio.create_task(job)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    return _json({"status": "ok"})
+
+
+async def metrics(request):
+    return web.Response(body=REGISTRY.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def queue_stats(request):
+    app = request.app
+    return _json({"in_flight": len(app[TASKS]), "users_in_flight": len(app[USER_LOCKS])})
+
+
+async def outbound_stats(request):
+    """
+    Pacing of the PHONE_NUMBER_ID token bucket, in the shape of the Flask
+    app's /webhook/outbound. Replies wait for their token in their own task,
+    so there is no queue, rejection or circuit breaker to report here.
+    """
+    bucket = request.app.get(OUTBOUND_BUCKET)
+    if bucket is None:
+        return _json({"status": "disabled"})
+    return _json({
+        "sent": bucket.acquired,
+        "buckets": {
+            request.app[CONFIG]["PHONE_NUMBER_ID"]: {
+                "sent": bucket.acquired,
+                "rejected": bucket.rejected,
+                "avg_wait_seconds": bucket.waited / bucket.acquired if bucket.acquired else 0.0,
+                "max_wait_seconds": bucket.max_wait,
+            }
+        },
+    })
+
+
+async def dedupe_stats(request):
+    return _json(get_deduper(request.app[CONFIG]).stats())
+
+
+async def outbox_stats(request):
+    outbox = get_outbox(request.app[CONFIG])
+    return _json(outbox.stats() if outbox is not None else {"status": "disabled"})
+
+
+async def delivery_stats(request):
+    tracker = get_delivery_tracker(request.app[CONFIG])
+    if tracker is None:
+        return _json({"status": "disabled"})
+    # Aggregates over the whole table: not on the event loop
+    summary, failing = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: (tracker.summary(), tracker.failing_recipients())
+    )
+    # Same report as app.views.delivery_stats: numbers masked, no per-number lookups
+    return _json({"summary": summary, "failing_recipients": masked_recipients(failing), "ingestion": tracker.stats()})
+
+
+async def _startup(app):
+    config = app[CONFIG]
+    app[GRAPH_CLIENT] = AsyncGraphClient(
+        access_token=config["ACCESS_TOKEN"],
+        phone_number_id=config["PHONE_NUMBER_ID"],
+        version=config["VERSION"],
+        base_url=config["GRAPH_API_BASE_URL"],
+        pool_size=config["GRAPH_ASYNC_POOL_SIZE"],
+        timeout=config["GRAPH_TIMEOUT"],
+        max_retries=config["GRAPH_MAX_RETRIES"],
+    )
+    get_session_store(config)
+    start_catalog_watcher(config)
+    # Replays the replies a previous process left unsent
+    get_outbox(config)
+    # The server accepts requests while the catalog loads in a thread
+    app[CATALOG_READY] = asyncio.get_running_loop().run_in_executor(None, get_dialogue_manager)
+
+
+async def _cleanup(app):
+    # Let acknowledged conversations finish before closing the HTTP session
+    tasks = app[TASKS]
+    if tasks:
+        _, pending = await asyncio.wait(set(tasks), timeout=app[CONFIG]["WORKER_DRAIN_TIMEOUT"])
+        for task in pending:
+            task.cancel()
+    await app[GRAPH_CLIENT].close()
+
+
+def create_async_app(config=None):
+    """aiohttp application serving the same /webhook contract as the Flask app."""
+    config = config if config is not None else read_configuration()
+    configure_logging()
+    app = web.Application()
+    app[CONFIG] = config
+    app[TASKS] = set()
+    app[USER_LOCKS] = {}
+    if config["OUTBOUND_SCHEDULER"]:
+        app[OUTBOUND_BUCKET] = TokenBucket(config["OUTBOUND_RATE"], config["OUTBOUND_BURST"])
+    app.on_startup.append(_startup)
+    app.on_cleanup.append(_cleanup)
+    app.router.add_get("/webhook", webhook_get)
+    app.router.add_post("/webhook", webhook_post)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/webhook/queue", queue_stats)
+    app.router.add_get("/webhook/outbound", outbound_stats)
+    app.router.add_get("/webhook/dedupe", dedupe_stats)
+    app.router.add_get("/webhook/outbox", outbox_stats)
+    app.router.add_get("/webhook/deliveries", delivery_stats)
+    return app
@@ -4,16 +4,86 @@ from dotenv import load_dotenv
 import logging
 
 
-def load_configurations(app):
+def _env_flag(name, default="false"):
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def read_configuration():
+    """Settings from the environment (and .env) as a plain dict."""
     load_dotenv()
-    app.config["ACCESS_TOKEN"] = os.getenv("ACCESS_TOKEN")
-    app.config["YOUR_PHONE_NUMBER"] = os.getenv("YOUR_PHONE_NUMBER")
-    app.config["APP_ID"] = os.getenv("APP_ID")
-    app.config["APP_SECRET"] = os.getenv("APP_SECRET")
-    app.config["RECIPIENT_WAID"] = os.getenv("RECIPIENT_WAID")
-    app.config["VERSION"] = os.getenv("VERSION")
-    app.config["PHONE_NUMBER_ID"] = os.getenv("PHONE_NUMBER_ID")
-    app.config["VERIFY_TOKEN"] = os.getenv("VERIFY_TOKEN")
+    config = {}
+    config["ACCESS_TOKEN"] = os.getenv("ACCESS_TOKEN")
+    config["YOUR_PHONE_NUMBER"] = os.getenv("YOUR_PHONE_NUMBER")
+    config["APP_ID"] = os.getenv("APP_ID")
+    config["APP_SECRET"] = os.getenv("APP_SECRET")
+    config["RECIPIENT_WAID"] = os.getenv("RECIPIENT_WAID")
+    config["VERSION"] = os.getenv("VERSION")
+    config["PHONE_NUMBER_ID"] = os.getenv("PHONE_NUMBER_ID")
+    config["VERIFY_TOKEN"] = os.getenv("VERIFY_TOKEN")
+    # Conversation sessions: maximum number kept in memory and idle timeout. The cap
+    # is a count of conversations, not bytes (about 1 KB each, so 10000 is ~10 MB);
+    # idle ones are swept every minute
+    config["SESSION_MAX_COUNT"] = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+    config["SESSION_TTL_SECONDS"] = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+    # Share sessions between worker processes through a SQLite file (empty keeps them in memory)
+    config["SESSION_SQLITE_PATH"] = os.getenv("SESSION_SQLITE_PATH", "")
+    config["SESSION_CONFLICT_RETRIES"] = int(os.getenv("SESSION_CONFLICT_RETRIES", "5"))
+    # Worker processes started by run_workers.py (defaults to one per CPU)
+    config["PROCESS_COUNT"] = int(os.getenv("PROCESS_COUNT", str(os.cpu_count() or 1)))
+    # Acknowledge webhooks immediately and process messages on a worker pool
+    config["ASYNC_WEBHOOK"] = _env_flag("ASYNC_WEBHOOK")
+    config["WORKER_COUNT"] = int(os.getenv("WORKER_COUNT", "4"))
+    config["WORKER_QUEUE_SIZE"] = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))
+    config["WORKER_DRAIN_TIMEOUT"] = float(os.getenv("WORKER_DRAIN_TIMEOUT", "10"))
+    # Outbound Graph API client (point GRAPH_API_BASE_URL at a local stub for testing)
+    config["GRAPH_API_BASE_URL"] = os.getenv("GRAPH_API_BASE_URL", "https://graph.facebook.com")
+    config["GRAPH_POOL_SIZE"] = int(os.getenv("GRAPH_POOL_SIZE", str(config["WORKER_COUNT"])))
+    config["GRAPH_TIMEOUT"] = float(os.getenv("GRAPH_TIMEOUT", "10"))
+    config["GRAPH_MAX_RETRIES"] = int(os.getenv("GRAPH_MAX_RETRIES", "3"))
+    # Open connections of the asyncio server's Graph API session (run_async.py)
+    config["GRAPH_ASYNC_POOL_SIZE"] = int(os.getenv("GRAPH_ASYNC_POOL_SIZE", "100"))
+    # Pace replies per phone number (Graph API throughput) and stop sending while the API fails
+    config["OUTBOUND_SCHEDULER"] = _env_flag("OUTBOUND_SCHEDULER")
+    config["OUTBOUND_RATE"] = float(os.getenv("OUTBOUND_RATE", "80"))
+    config["OUTBOUND_BURST"] = int(os.getenv("OUTBOUND_BURST", "80"))
+    config["OUTBOUND_MAX_PENDING"] = int(os.getenv("OUTBOUND_MAX_PENDING", "10000"))
+    config["OUTBOUND_MAX_AGE"] = float(os.getenv("OUTBOUND_MAX_AGE", "120"))
+    config["OUTBOUND_BREAKER_FAILURES"] = int(os.getenv("OUTBOUND_BREAKER_FAILURES", "5"))
+    config["OUTBOUND_BREAKER_RESET"] = float(os.getenv("OUTBOUND_BREAKER_RESET", "30"))
+    # Drop redelivered webhook messages by id (set DEDUPE_SQLITE_PATH to share it between processes)
+    config["DEDUPE_MAX_ENTRIES"] = int(os.getenv("DEDUPE_MAX_ENTRIES", "100000"))
+    config["DEDUPE_TTL_SECONDS"] = float(os.getenv("DEDUPE_TTL_SECONDS", "86400"))
+    config["DEDUPE_SQLITE_PATH"] = os.getenv("DEDUPE_SQLITE_PATH", "")
+    # Durable outbox: replies are written to this SQLite file before being sent and
+    # replayed after a crash (empty disables it). A reply nobody marked delivered
+    # within the lease is sent again, so keep the lease above OUTBOUND_MAX_AGE.
+    config["OUTBOX_SQLITE_PATH"] = os.getenv("OUTBOX_SQLITE_PATH", "")
+    config["OUTBOX_LEASE_SECONDS"] = float(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+    config["OUTBOX_MAX_ATTEMPTS"] = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+    config["OUTBOX_RETRY_DELAY"] = float(os.getenv("OUTBOX_RETRY_DELAY", "5"))
+    # WhatsApp only accepts free-form replies for 24h after the user's last message
+    config["OUTBOX_MAX_AGE"] = float(os.getenv("OUTBOX_MAX_AGE", "86400"))
+    config["OUTBOX_RELAY_INTERVAL"] = float(os.getenv("OUTBOX_RELAY_INTERVAL", "5"))
+    # Store delivery statuses (sent/delivered/read/failed) of replies in this SQLite file
+    # (empty only logs them); they are buffered in memory and written in batches
+    config["DELIVERY_SQLITE_PATH"] = os.getenv("DELIVERY_SQLITE_PATH", "")
+    config["DELIVERY_FLUSH_INTERVAL"] = float(os.getenv("DELIVERY_FLUSH_INTERVAL", "1"))
+    config["DELIVERY_BATCH_SIZE"] = int(os.getenv("DELIVERY_BATCH_SIZE", "1000"))
+    config["DELIVERY_MAX_BUFFERED"] = int(os.getenv("DELIVERY_MAX_BUFFERED", "100000"))
+    config["DELIVERY_RETENTION_SECONDS"] = float(os.getenv("DELIVERY_RETENTION_SECONDS", "604800"))
+    # Poll rooms_database.json for changes every N seconds (0 disables hot reload)
+    config["CATALOG_RELOAD_INTERVAL"] = float(os.getenv("CATALOG_RELOAD_INTERVAL", "5"))
+    config["CATALOG_RELOAD_HASH"] = _env_flag("CATALOG_RELOAD_HASH")
+    # Profile a fraction of webhook requests (0 disables, 1 profiles all) and keep the slow ones
+    config["PROFILE_SAMPLE_RATE"] = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    config["PROFILE_THRESHOLD_MS"] = float(os.getenv("PROFILE_THRESHOLD_MS", "500"))
+    config["PROFILE_DIR"] = os.getenv("PROFILE_DIR", "./profiles")
+    config["PROFILE_MAX_FILES"] = int(os.getenv("PROFILE_MAX_FILES", "50"))
+    return config
+
+
+def load_configurations(app):
+    app.config.update(read_configuration())
 
 
 def configure_logging():
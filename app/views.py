@@ -1,11 +1,21 @@
 import logging
-import json
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, g, request, jsonify, current_app
+
+from immobot_config.metrics import CONTENT_TYPE, REGISTRY, timed
 
 from WhatsApp_config.security.sec_webhook import signature_required
+from WhatsApp_config.profiling import profiled
+from WhatsApp_config.events import is_status_only, parse_webhook
+from WhatsApp_config.delivery import masked_recipients
 from WhatsApp_config.whatsapp_resp import (
     process_whatsapp_message,
-    is_valid_whatsapp_message,
+    enqueue_whatsapp_message,
+    get_dispatcher,
+    get_outbound_scheduler,
+    get_deduper,
+    get_outbox,
+    get_delivery_tracker,
+    track_statuses,
 )
 
 webhook_blueprint = Blueprint("webhook", __name__)
@@ -13,35 +23,46 @@ webhook_blueprint = Blueprint("webhook", __name__)
 def handle_message():
     """
     Handle incoming webhook events from the WhatsApp API.
+    The raw body (already read for the signature check) is parsed once into
+    a typed WebhookEvent that the rest of the pipeline consumes.
     Returns:
         response: A tuple containing a JSON response and an HTTP status code.
     """
-    body = request.get_json()
-
-    # Check if it's a WhatsApp status update
-    if (
-        body.get("entry", [{}])[0]
-        .get("changes", [{}])[0]
-        .get("value", {})
-        .get("statuses")
-    ):
-        logging.info("Received a WhatsApp status update.")
+    raw = request.get_data(cache=True)
+
+    # Status updates (sent/delivered/read) carry no message: buffer them unparsed and acknowledge
+    if is_status_only(raw):
+        track_statuses(raw)
         return jsonify({"status": "ok"}), 200
 
     try:
-        if is_valid_whatsapp_message(body):
-            process_whatsapp_message(body)
-            return jsonify({"status": "ok"}), 200
-        else:
-            # if the request is not a WhatsApp API event, return an error
-            return (
-                jsonify({"status": "error", "message": "Not a WhatsApp API event"}),
-                404,
-            )
-    except json.JSONDecodeError:
+        with timed("parse"):
+            event = parse_webhook(raw)
+        g.webhook_event = event
+    except ValueError:
         logging.error("Failed to decode JSON")
         return jsonify({"status": "error", "message": "Invalid JSON provided"}), 400
 
+    if event.statuses:
+        track_statuses(event.statuses)
+    if not event.is_whatsapp_message():
+        if event.statuses:
+            return jsonify({"status": "ok"}), 200
+        # if the request is not a WhatsApp API event, return an error
+        return (
+            jsonify({"status": "error", "message": "Not a WhatsApp API event"}),
+            404,
+        )
+
+    if current_app.config["ASYNC_WEBHOOK"]:
+        # Acknowledge right away, the workers send the reply
+        if not enqueue_whatsapp_message(event):
+            # Backpressure: Meta redelivers the event later
+            return jsonify({"status": "error", "message": "Server busy"}), 503
+        return jsonify({"status": "ok"}), 200
+    process_whatsapp_message(event)
+    return jsonify({"status": "ok"}), 200
+
 
 # Required webhook verifictaion for WhatsApp
 def verify():
@@ -66,11 +87,67 @@ def verify():
         return jsonify({"status": "error", "message": "Missing parameters"}), 400
 
 
+@webhook_blueprint.route("/webhook/queue", methods=["GET"])
+def queue_stats():
+    """Depth and wait time of the background worker queue."""
+    if not current_app.config["ASYNC_WEBHOOK"]:
+        return jsonify({"status": "disabled"}), 200
+    return jsonify(get_dispatcher().stats()), 200
+
+
+@webhook_blueprint.route("/webhook/outbound", methods=["GET"])
+def outbound_stats():
+    """Per-number token bucket waits, rejections and circuit breaker state."""
+    if not current_app.config["OUTBOUND_SCHEDULER"]:
+        return jsonify({"status": "disabled"}), 200
+    return jsonify(get_outbound_scheduler().stats()), 200
+
+
+@webhook_blueprint.route("/webhook/dedupe", methods=["GET"])
+def dedupe_stats():
+    """Redelivered (hits) and first-seen (misses) message counts."""
+    return jsonify(get_deduper().stats()), 200
+
+
+@webhook_blueprint.route("/webhook/outbox", methods=["GET"])
+def outbox_stats():
+    """Pending, delivered and abandoned replies, and writes per group commit."""
+    outbox = get_outbox()
+    if outbox is None:
+        return jsonify({"status": "disabled"}), 200
+    return jsonify(outbox.stats()), 200
+
+
+@webhook_blueprint.route("/webhook/deliveries", methods=["GET"])
+def delivery_stats():
+    """
+    Delivery and failure rates and sent-to-delivered latency of replies, the
+    recipients failing most (numbers masked: this endpoint is not
+    authenticated), and the state of this process's status buffer.
+    """
+    tracker = get_delivery_tracker()
+    if tracker is None:
+        return jsonify({"status": "disabled"}), 200
+    return jsonify({
+        "summary": tracker.summary(),
+        "failing_recipients": masked_recipients(tracker.failing_recipients()),
+        "ingestion": tracker.stats(),
+    }), 200
+
+
+@webhook_blueprint.route("/metrics", methods=["GET"])
+def metrics():
+    """Per-stage latency histograms and message counters of this process, Prometheus text format."""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
 @webhook_blueprint.route("/webhook", methods=["GET"])
 def webhook_get():
     return verify()
 
 @webhook_blueprint.route("/webhook", methods=["POST"])
+@timed("total")
+@profiled
 @signature_required
 def webhook_post():
     return handle_message()
@@ -0,0 +1,71 @@
+"""
+Compare the indexed PropertyDatabase.find_properties with the linear scan.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_find_properties [--sizes 10000 100000 1000000]
+"""
+import argparse
+import random
+import time
+
+from immobot_config.database import PropertyDatabase
+
+CITIES = ["Casablanca", "Rabat", "Marrakech", "Tanger", "Fes", "Agadir", "Meknes", "Oujda"]
+
+
+def synthetic_properties(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"prop{i}",
+            "rooms": rng.randint(1, 6),
+            "price": rng.randrange(300, 20000, 50),
+            "currency": "MAD",
+            "city": rng.choice(CITIES),
+            "available": rng.random() > 0.1,
+        }
+        for i in range(count)
+    ]
+
+
+QUERIES = [
+    {"rooms": 2, "budget": 5000, "city": "casablanca"},
+    {"rooms": 3, "budget": 1500, "city": "Rabat"},
+    {"rooms": 1, "budget": 20000, "city": "marrakech"},
+    {"rooms": 4, "budget": None, "city": "tanger"},
+    {"rooms": 2, "budget": 800, "city": "nowhere"},
+]
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'listings':>10} {'build (s)':>10} {'scan (ms)':>10} {'index (ms)':>11} {'speedup':>8}")
+    for size in args.sizes:
+        properties = synthetic_properties(size)
+        start = time.perf_counter()
+        db = PropertyDatabase(properties=properties)
+        build = time.perf_counter() - start
+
+        for criteria in QUERIES:
+            assert db.find_properties(criteria) == db._scan_properties(criteria), criteria
+
+        scan = best_of(lambda: [db._scan_properties(c) for c in QUERIES], args.repeat) / len(QUERIES)
+        indexed = best_of(lambda: [db.find_properties(c) for c in QUERIES], args.repeat) / len(QUERIES)
+        print(f"{size:>10} {build:>10.2f} {scan * 1000:>10.2f} {indexed * 1000:>11.3f} {scan / indexed:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
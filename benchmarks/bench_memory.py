@@ -0,0 +1,51 @@
+"""
+Memory held by the catalog rows: JSON dicts against Property records.
+
+The catalog is serialized and parsed again, so every listing owns its strings
+like after json.load of rooms_database.json, then measured with tracemalloc.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_memory [--listings 100000]
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from benchmarks.catalog import generate_catalog
+from immobot_config.records import to_records
+
+
+def traced(build):
+    """(result, bytes still allocated by `build` once it returned, seconds)."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--listings", type=int, default=100_000)
+    args = parser.parse_args()
+
+    raw = json.dumps(generate_catalog(args.listings), ensure_ascii=False)
+    dicts, dict_bytes, parse_time = traced(lambda: json.loads(raw))
+    records, record_bytes, build_time = traced(lambda: to_records(json.loads(raw)))
+    assert [record.to_dict() for record in records] == dicts
+
+    print(f"{args.listings} listings")
+    print(f"{'':>8} {'total (MB)':>11} {'bytes/listing':>14} {'load (s)':>9}")
+    print(f"{'dicts':>8} {dict_bytes / 1e6:>11.1f} {dict_bytes / args.listings:>14.0f} {parse_time:>9.2f}")
+    print(f"{'records':>8} {record_bytes / 1e6:>11.1f} {record_bytes / args.listings:>14.0f} {build_time:>9.2f}")
+    print(f"{record_bytes / dict_bytes:.2f}x the memory of the dicts")
+
+
+if __name__ == "__main__":
+    main()
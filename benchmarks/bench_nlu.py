@@ -0,0 +1,151 @@
+"""
+Throughput of the LanguageManager pipeline against the original per-call implementation.
+
+The legacy functions below are the pre-compilation code, kept verbatim as the
+reference: both pipelines must give identical results on the regression corpus,
+except for the city captures listed in CITY_CAPTURE_CHANGES.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_nlu [--rounds 2000]
+"""
+import argparse
+import re
+import time
+
+from immobot_config.language import Language, LanguageManager
+
+CORPUS = [
+    # Greetings and small talk
+    "hello", "Hi", "  hey ", "good morning", "okay", "yes", "bonjour", "Salut", "bnj", "oui",
+    "مرحبا", "السلام عليكم", "حسنا", "salam", "slm", "labas", "wakha", "safi", "Ok",
+    "Hello there, I am looking for a flat", "je cherche une chambre", "tu peux m'aider ?",
+    # Rooms
+    "2 rooms", "I need 3 bedrooms", "1 room please", "4 pieces", "2 chambres", "3 pièces svp",
+    "2 غرف", "غرفة 1", "3 غرفة", "bghit 2 bit", "3 byout 3afak", "2 chombrat", "khasni 1 chambre",
+    "two rooms", "rooms: 2", "٣ غرف",
+    # Budgets
+    "600 dh", "my budget is 1500 dirham", "2000 usd", "800$", "500 dollars", "1200 درهم",
+    "ch7al? 700 derham", "900 drahm", "budget 1000", "3000 DH max",
+    # Cities
+    "in Casablanca", "at rabat", "dans marrakech", "à Tanger", "f casablanca", "fi rabat",
+    "fmdinat fes", "في الدار البيضاء", "Casablanka", "casa", "for agadir, please", "in new york city",
+    # Mixed
+    "Salam bghit 2 bit f casablanca b 600 dh", "Bonjour, je recherche 2 chambres à Rabat pour 900 dh",
+    "Hi, 3 rooms in Marrakech under 2000 dirham", "مرحبا أريد 2 غرف في الرباط 1500 درهم",
+    "dyal 2 byout f tanger 800 dh", "", "   ", "1234567890", "!!!", "zwin bzaf",
+]
+
+
+# City captures that intentionally differ from the legacy pattern, which only
+# kept one ASCII word: up to three words of any script are captured now (the
+# catalog's CityResolver picks the city out of them) and prepositions must
+# start a word.
+CITY_CAPTURE_CHANGES = {
+    "Hello there, I am looking for a flat": "a flat",
+    "في الدار البيضاء": "الدار البيضاء",
+    "in new york city": "new york city",
+    "Salam bghit 2 bit f casablanca b 600 dh": "casablanca b",
+    "Bonjour, je recherche 2 chambres à Rabat pour 900 dh": "rabat pour",
+    "Hi, 3 rooms in Marrakech under 2000 dirham": "marrakech under",
+    "مرحبا أريد 2 غرف في الرباط 1500 درهم": "الرباط",
+    "zwin bzaf": None,
+}
+
+
+# --- Original implementation ------------------------------------------------
+
+def legacy_detect_language(message):
+    message_lower = message.lower()
+    for word in LanguageManager.DARIJA_WORDS:
+        if word in message_lower:
+            return Language.DA
+    if re.search(r'[\u0600-\u06FF]', message):
+        return Language.AR
+    french_patterns = r'\b(bonjour|salut|recherche|chambre|prix|slt|bnj|oui|je|tu|peut|jai)\b'
+    if re.search(french_patterns, message_lower):
+        return Language.FR
+    return Language.EN
+
+
+def legacy_is_greeting(message):
+    msg_lower = message.lower().strip()
+    all_greetings = []
+    for greetings in LanguageManager.GREETINGS.values():
+        all_greetings.extend(greetings)
+    return msg_lower in all_greetings
+
+
+def legacy_extract_number(message, lang):
+    patterns = {
+        "fr": r'(\d+)\s*(chambre?|chambres?|pièces?)',
+        "en": r'(\d+)\s*(for|rooms?|bedrooms?|bedroom?|room?|pieces?)',
+        "ar": r'(\d+)\s*(غرف|غرفة)',
+        "da": r'(\d+)\s*(bit|biyout|byout|chombrat|chambre|غرفة)'
+    }
+    match = re.search(patterns[lang.value], message.lower())
+    return int(match.group(1)) if match else None
+
+
+def legacy_extract_budget(message):
+    pattern = r'(\d+)\s*(dollars?|dirham|dh|derham|drahm|usd|\$|درهم|دولار)'
+    match = re.search(pattern, message.lower())
+    return int(match.group(1)) if match else None
+
+
+def legacy_extract_city(message, lang):
+    pattern = r'(?:in|a|at|for|dans|f|fi|fmdint|fmdinat|à|في|فى|ف)\s+([A-Za-z\s]+?)(?=\s+|$|,|\sin|\sat)'
+    match = re.search(pattern, message.lower(), re.IGNORECASE)
+    if match:
+        return match.group(1).strip()
+    return None
+
+
+def legacy_pipeline(message):
+    lang = legacy_detect_language(message)
+    return (lang, legacy_is_greeting(message), legacy_extract_number(message, lang),
+            legacy_extract_budget(message), legacy_extract_city(message, lang))
+
+
+def compiled_pipeline(message):
+    analysis = LanguageManager.analyze(message)
+    return (analysis.language, analysis.is_greeting, analysis.rooms, analysis.budget, analysis.city)
+
+
+def check_regressions():
+    for message in CORPUS:
+        expected = legacy_pipeline(message)
+        if message in CITY_CAPTURE_CHANGES:
+            expected = expected[:4] + (CITY_CAPTURE_CHANGES[message],)
+        assert compiled_pipeline(message) == expected, (message, expected)
+        lang = expected[0]
+        assert LanguageManager.detect_language(message) == lang, message
+        assert LanguageManager.is_greeting(message) == expected[1], message
+        for other in Language:
+            assert LanguageManager.extract_number(message, other) == legacy_extract_number(message, other), message
+        assert LanguageManager.extract_budget(message) == expected[3], message
+        assert LanguageManager.extract_city(message, lang) == expected[4], message
+
+
+def throughput(pipeline, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in CORPUS:
+            pipeline(message)
+    return rounds * len(CORPUS) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    check_regressions()
+    print(f"Regression corpus: {len(CORPUS)} messages, identical outputs")
+    before = throughput(legacy_pipeline, args.rounds)
+    after = throughput(compiled_pipeline, args.rounds)
+    print(f"before: {before:>10,.0f} msg/s")
+    print(f"after:  {after:>10,.0f} msg/s  ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
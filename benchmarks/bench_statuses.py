@@ -0,0 +1,70 @@
+"""
+Cost of a delivery-status callback on the webhook path, and flush throughput.
+
+Compares what the handler used to do with a status callback (one log line)
+with DeliveryTracker.add, then times writing the buffered callbacks: every
+message of the run is reported sent, delivered and read, and 2% of them fail.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_statuses [--messages 20000]
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.payloads import status_body
+from WhatsApp_config.delivery import DeliveryTracker
+
+
+def callbacks(messages):
+    start = int(time.time())
+    bodies = []
+    for i in range(messages):
+        wa_id = f"2126{i % 500:08d}"
+        message_id = f"wamid.bench.{i}"
+        statuses = ["sent", "failed"] if i % 50 == 0 else ["sent", "delivered", "read"]
+        for offset, status in enumerate(statuses):
+            body = status_body(wa_id, message_id, status, timestamp=start + offset * (1 + i % 7))
+            bodies.append(json.dumps(body).encode("utf-8"))
+    return bodies
+
+
+def per_call_us(func, bodies):
+    start = time.perf_counter()
+    for raw in bodies:
+        func(raw)
+    return (time.perf_counter() - start) / len(bodies) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20_000)
+    args = parser.parse_args()
+
+    bodies = callbacks(args.messages)
+    with tempfile.TemporaryDirectory() as tmp:
+        logging.basicConfig(level=logging.INFO, stream=open(os.devnull, "w"))
+        log_us = per_call_us(lambda raw: logging.info("Received a WhatsApp status update."), bodies)
+
+        # Nothing is flushed while the handler side is measured
+        tracker = DeliveryTracker(os.path.join(tmp, "deliveries.sqlite"), flush_interval=3600,
+                                  batch_size=len(bodies) + 1, max_buffered=len(bodies))
+        add_us = per_call_us(tracker.add, bodies)
+        start = time.perf_counter()
+        rows = tracker.flush()
+        flush_time = time.perf_counter() - start
+        summary = tracker.summary()
+        tracker.close()
+
+    print(f"{len(bodies)} status callbacks for {args.messages} messages")
+    print(f"handler, log line:  {log_us:.2f} us/callback")
+    print(f"handler, buffered:  {add_us:.2f} us/callback")
+    print(f"flush: {rows} rows in {flush_time:.2f}s ({len(bodies) / flush_time:,.0f} callbacks/s)")
+    print(f"failure rate {summary['failure_rate']:.1%}, delivery seconds {summary['delivery_seconds']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Generate a synthetic rooms_database.json catalog of any size.
+
+Usage (from the repository root):
+    python -m benchmarks.catalog --size 100000 --out /tmp/catalog.json
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+
+from benchmarks.bench_find_properties import CITIES
+
+AMENITIES = {
+    "fr": ["parking", "wifi", "sécurité", "climatisation", "ascenseur", "balcon", "meublé", "piscine"],
+    "en": ["parking", "wifi", "security", "air conditioning", "elevator", "balcony", "furnished", "pool"],
+    "ar": ["موقف سيارات", "واي فاي", "أمن", "تكييف", "مصعد", "شرفة", "مفروش", "مسبح"],
+    "da": ["parking", "wifi", "surveillance", "climatiseur", "ascenseur", "balcon", "mfarch", "piscine"],
+}
+
+DESCRIPTIONS = {
+    "fr": "Appartement lumineux proche des commerces",
+    "en": "Bright apartment close to shops",
+    "ar": "شقة مشرقة قريبة من المتاجر",
+    "da": "dar fiha dow qriba l7wanet",
+}
+
+
+def generate_catalog(count, seed=42):
+    """Listings shaped like rooms_database.json, with ~10% unavailable."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    properties = []
+    for i in range(count):
+        picked = sorted(rng.sample(range(len(AMENITIES["en"])), rng.randint(1, 5)))
+        properties.append({
+            "id": f"prop{i}",
+            "rooms": rng.randint(1, 6),
+            "price": rng.randrange(300, 20000, 50),
+            "currency": "MAD",
+            "city": rng.choice(CITIES),
+            "available": rng.random() > 0.1,
+            "address": f"Quartier {rng.randint(1, 300)}, Rue {rng.randint(1, 120)}",
+            "amenities": {lang: [words[j] for j in picked] for lang, words in AMENITIES.items()},
+            "photos": [f"https://example.com/photos/{i}/{n}.jpg" for n in range(rng.randint(1, 4))],
+            "description": dict(DESCRIPTIONS),
+            "agent": f"06{rng.randint(10000000, 99999999)}",
+            "created_at": (start + timedelta(minutes=rng.randint(0, 60 * 24 * 365))).isoformat(),
+        })
+    return properties
+
+
+def write_catalog(path, count, seed=42):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(generate_catalog(count, seed), f, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="rooms_database.synthetic.json")
+    args = parser.parse_args()
+    write_catalog(args.out, args.size, args.seed)
+    print(f"Wrote {args.size} listings to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
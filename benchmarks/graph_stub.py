@@ -0,0 +1,107 @@
+"""
+Local stand-in for the Graph API /messages endpoint.
+
+Every POST waits `latency` seconds (plus uniform jitter) and fails with a
+503 at `error_rate`, so GraphClient retries and the outbound circuit breaker
+can be exercised without touching the real API. Point GRAPH_API_BASE_URL at it.
+
+Usage (from the repository root):
+    python -m benchmarks.graph_stub --port 8098 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class GraphStub:
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, host="127.0.0.1", port=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.delivered = 0
+        self.errors = 0
+        self.ids = itertools.count()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+            # Headers and body are written separately: without this, Nagle's
+            # algorithm and delayed ACKs add ~40ms to every kept-alive request
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub.lock:
+                    delay = stub.latency + stub.rng.uniform(0, stub.jitter)
+                    fail = stub.rng.random() < stub.error_rate
+                time.sleep(delay)
+                if fail or not self.path.endswith("/messages"):
+                    with stub.lock:
+                        stub.errors += 1
+                    self._reply(503 if fail else 404, {"error": {"message": "stub error", "code": 2}})
+                    return
+                to = json.loads(raw).get("to")
+                with stub.lock:
+                    stub.delivered += 1
+                self._reply(200, {
+                    "messaging_product": "whatsapp",
+                    "contacts": [{"input": to, "wa_id": to}],
+                    "messages": [{"id": f"wamid.stub.{next(stub.ids)}"}],
+                })
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="graph-stub", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    stub = GraphStub(args.latency, args.jitter, args.error_rate, port=args.port)
+    print(f"Graph API stub listening on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
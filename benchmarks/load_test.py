@@ -0,0 +1,189 @@
+"""
+End-to-end load test: signed multi-turn conversations against the webhook.
+
+By default the Flask app is served in-process on a synthetic catalog and
+replies go to a local Graph API stub. Pass --target to drive a server that
+is already running (run.py, run_async.py or run_workers.py started with the
+same APP_SECRET and GRAPH_API_BASE_URL pointing at a stub).
+
+Usage (from the repository root):
+    python -m benchmarks.load_test [--users 200] [--concurrency 32] [--listings 10000]
+    python -m benchmarks.load_test --save-baseline default
+    python -m benchmarks.load_test --check default
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from benchmarks.catalog import write_catalog
+from benchmarks.graph_stub import GraphStub
+from benchmarks.payloads import CONVERSATIONS, LANGUAGES, conversation
+
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+SECRET = "load-test-secret"
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def start_local_app(args, stub_url, workdir):
+    """Serve the Flask app in this process with a synthetic catalog; returns its base URL."""
+    catalog = os.path.join(workdir, "catalog.json")
+    write_catalog(catalog, args.listings)
+    os.environ.update({
+        "APP_SECRET": SECRET,
+        "ACCESS_TOKEN": "load-test",
+        "VERIFY_TOKEN": "load-test",
+        "VERSION": "v21.0",
+        "PHONE_NUMBER_ID": "123456789",
+        "GRAPH_API_BASE_URL": stub_url,
+        "CATALOG_PATH": catalog,
+        "CATALOG_SQLITE_PATH": os.path.join(workdir, "catalog.sqlite"),
+        "CATALOG_RELOAD_INTERVAL": "0",
+        "ASYNC_WEBHOOK": "true" if args.async_webhook else "false",
+        # Synchronous replies are sent from the request threads: one connection each
+        "GRAPH_POOL_SIZE": str(max(args.concurrency, int(os.getenv("WORKER_COUNT", "4")))),
+    })
+    # Imported once os.environ is set: create_app builds its config with read_configuration,
+    # and the catalog (loaded on the first message) reads CATALOG_PATH from the environment
+    from werkzeug.serving import make_server
+    from app import create_app
+    import logging
+
+    app = create_app()
+    # Per-request access and Graph API logs would dominate the measurement
+    logging.disable(logging.INFO)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-test-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def run(args):
+    stub = None
+    server = None
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.target:
+            target, secret = args.target.rstrip("/"), args.secret
+        else:
+            stub = GraphStub(args.graph_latency, args.graph_jitter, args.graph_error_rate, seed=1).start()
+            target, server = start_local_app(args, stub.url, workdir)
+            secret = SECRET
+
+        run_id = str(int(time.time() * 1000))
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+        local = threading.local()
+
+        def drive(user):
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = requests.Session()
+            for raw, headers in conversation(user, secret, run_id):
+                start = time.perf_counter()
+                status = session.post(f"{target}/webhook", data=raw, headers=headers).status_code
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        expected_replies = sum(len(CONVERSATIONS[LANGUAGES[u % len(LANGUAGES)]]) for u in range(args.users))
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(drive, range(args.users)))
+        acked = time.perf_counter() - start
+        if stub is not None:
+            # With ASYNC_WEBHOOK the replies are still on their way
+            deadline = time.monotonic() + 60
+            while stub.delivered < expected_replies and time.monotonic() < deadline:
+                time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        if server is not None:
+            server.shutdown()
+        if stub is not None:
+            stub.stop()
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "throughput_rps": len(latencies) / acked if acked else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "replies_delivered": stub.delivered if stub is not None else None,
+        "replies_expected": expected_replies,
+        "graph_errors": stub.errors if stub is not None else None,
+        "reply_throughput_rps": (stub.delivered / elapsed) if stub is not None and elapsed else None,
+    }
+
+
+def check(result, baseline, tolerance):
+    """Regressions of `result` against `baseline`, as messages."""
+    problems = []
+    if result["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        problems.append(f"throughput {result['throughput_rps']:.1f} rps < baseline {baseline['throughput_rps']:.1f} rps")
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        if result[key] > baseline[key] * (1 + tolerance):
+            problems.append(f"{key} {result[key]:.1f} > baseline {baseline[key]:.1f}")
+    if result["replies_expected"] and result.get("replies_delivered") is not None \
+            and result["replies_delivered"] < result["replies_expected"]:
+        problems.append(f"only {result['replies_delivered']}/{result['replies_expected']} replies delivered")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--listings", type=int, default=10_000)
+    parser.add_argument("--async-webhook", action="store_true", help="acknowledge first, reply from the workers")
+    parser.add_argument("--graph-latency", type=float, default=0.05)
+    parser.add_argument("--graph-jitter", type=float, default=0.02)
+    parser.add_argument("--graph-error-rate", type=float, default=0.0)
+    parser.add_argument("--target", help="base URL of a running server instead of the in-process app")
+    parser.add_argument("--secret", default=os.getenv("APP_SECRET", ""), help="APP_SECRET of --target")
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--check", metavar="NAME", help="fail if worse than the stored baseline NAME")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    result = run(args)
+    params = {key: getattr(args, key) for key in (
+        "users", "concurrency", "listings", "async_webhook", "graph_latency", "graph_jitter", "graph_error_rate")}
+    print(json.dumps({"params": params, **result}, indent=2))
+
+    baselines = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+    if args.save_baseline:
+        baselines[args.save_baseline] = {"params": params, **result}
+        BASELINES_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Saved baseline {args.save_baseline!r} to {BASELINES_PATH}")
+    if args.check:
+        if args.check not in baselines:
+            sys.exit(f"No baseline named {args.check!r} in {BASELINES_PATH}")
+        baseline = baselines[args.check]
+        if baseline["params"] != params:
+            print(f"Warning: parameters differ from baseline {args.check!r}: {baseline['params']}")
+        problems = check(result, baseline, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+        print(f"No regression against baseline {args.check!r} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Signed webhook payloads that drive complete conversations in every language.
+
+Each simulated user greets the bot, answers rooms, budget and city, then
+asks for the next page of results, exactly like a WhatsApp user would.
+
+Usage (from the repository root), to print one signed conversation:
+    python -m benchmarks.payloads --secret my_app_secret --language ar
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import time
+
+# One conversation per language, each message understood by LanguageManager
+CONVERSATIONS = {
+    "fr": ["bonjour", "2 chambres", "5000 dh", "dans casablanca", "plus"],
+    "en": ["hello", "2 rooms", "5000 dh", "in casablanca", "more"],
+    "ar": ["مرحبا", "2 غرف", "5000 درهم", "في casablanca", "المزيد"],
+    "da": ["salam", "2 bit", "5000 dh", "f casablanca", "zid"],
+}
+LANGUAGES = tuple(CONVERSATIONS)
+
+
+def webhook_body(wa_id, text, message_id, phone_number_id="123456789"):
+    """A text-message delivery as sent by the WhatsApp Cloud API."""
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "WHATSAPP_BUSINESS_ACCOUNT_ID",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550000000", "phone_number_id": phone_number_id},
+                    "contacts": [{"profile": {"name": f"User {wa_id}"}, "wa_id": wa_id}],
+                    "messages": [{
+                        "from": wa_id,
+                        "id": message_id,
+                        "timestamp": str(int(time.time())),
+                        "type": "text",
+                        "text": {"body": text},
+                    }],
+                },
+            }],
+        }],
+    }
+
+
+def status_body(wa_id, message_id, status, phone_number_id="123456789", timestamp=None):
+    """A delivery-status callback (sent, delivered, read or failed) for an outgoing message."""
+    value = {
+        "id": message_id,
+        "status": status,
+        "timestamp": str(int(timestamp if timestamp is not None else time.time())),
+        "recipient_id": wa_id,
+    }
+    if status == "failed":
+        value["errors"] = [{"code": 131047, "title": "Re-engagement message"}]
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "WHATSAPP_BUSINESS_ACCOUNT_ID",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550000000", "phone_number_id": phone_number_id},
+                    "statuses": [value],
+                },
+            }],
+        }],
+    }
+
+
+def sign(raw, secret):
+    """X-Hub-Signature-256 header value for the raw body."""
+    return "sha256=" + hmac.new(secret.encode("latin-1"), raw, hashlib.sha256).hexdigest()
+
+
+def signed_request(wa_id, text, message_id, secret):
+    raw = json.dumps(webhook_body(wa_id, text, message_id), ensure_ascii=False).encode("utf-8")
+    return raw, {"Content-Type": "application/json", "X-Hub-Signature-256": sign(raw, secret)}
+
+
+def conversation(user, secret, run_id="bench"):
+    """
+    The signed requests of one user's conversation, in order. Users cycle
+    through the four languages.
+    """
+    language = LANGUAGES[user % len(LANGUAGES)]
+    wa_id = f"2126{user:08d}"
+    return [
+        signed_request(wa_id, text, f"wamid.{run_id}.{user}.{turn}", secret)
+        for turn, text in enumerate(CONVERSATIONS[language])
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--secret", required=True)
+    parser.add_argument("--language", choices=LANGUAGES, default="fr")
+    args = parser.parse_args()
+    for raw, headers in conversation(LANGUAGES.index(args.language), args.secret):
+        print(headers["X-Hub-Signature-256"], raw.decode("utf-8"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import logging
+import re
+import unicodedata
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+# Canonical amenity vocabulary: each amenity's position is its bit in the
+# masks stored by the catalog indexes (and in SQLite catalogs), so new
+# amenities must be appended, never inserted or reordered.
+VOCABULARY = [
+    ("parking", {
+        "fr": ["parking", "garage", "place de parking"],
+        "en": ["parking", "car park", "garage"],
+        "ar": ["موقف سيارات", "موقف", "مرآب", "باركينغ"],
+        "da": ["parking", "barking", "garage"],
+    }),
+    ("wifi", {
+        "fr": ["wifi", "wi-fi", "internet"],
+        "en": ["wifi", "wi-fi", "internet"],
+        "ar": ["واي فاي", "انترنت", "ويفي"],
+        "da": ["wifi", "internet"],
+    }),
+    ("security", {
+        "fr": ["sécurité", "gardien", "gardiennage"],
+        "en": ["security", "guard", "gated"],
+        "ar": ["أمن", "حراسة", "حارس"],
+        "da": ["surveillance", "3assas", "securite"],
+    }),
+    ("air_conditioning", {
+        "fr": ["climatisation", "clim", "climatisé"],
+        "en": ["air conditioning", "air conditioner", "aircon"],
+        "ar": ["تكييف", "مكيف"],
+        "da": ["climatiseur", "klima", "klimatiseur"],
+    }),
+    ("garden", {
+        "fr": ["jardin"],
+        "en": ["garden", "yard"],
+        "ar": ["حديقة", "جنان"],
+        "da": ["jardin", "jnan", "jerda"],
+    }),
+    ("pool", {
+        "fr": ["piscine"],
+        "en": ["pool", "swimming pool"],
+        "ar": ["مسبحة", "مسبح", "بيسين"],
+        "da": ["piscine", "pisin"],
+    }),
+    ("elevator", {
+        "fr": ["ascenseur"],
+        "en": ["elevator", "lift"],
+        "ar": ["مصعد"],
+        "da": ["ascenseur", "sansour"],
+    }),
+    ("balcony", {
+        "fr": ["balcon"],
+        "en": ["balcony"],
+        "ar": ["شرفة", "بالكون"],
+        "da": ["balcon", "balkon"],
+    }),
+    ("furnished", {
+        "fr": ["meublé", "meublée"],
+        "en": ["furnished"],
+        "ar": ["مفروش", "مفروشة"],
+        "da": ["mfarch", "mfrouch", "mfer4a"],
+    }),
+    ("terrace", {
+        "fr": ["terrasse"],
+        "en": ["terrace", "rooftop"],
+        "ar": ["سطح", "تراس"],
+        "da": ["stah", "terrasse"],
+    }),
+]
+
+AMENITY_IDS: Dict[str, int] = {name: bit for bit, (name, _) in enumerate(VOCABULARY)}
+
+
+def fold(text: str) -> str:
+    """Lowercase without accents, so "Sécurité" and "securite" are the same label."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+# Folded label (any language) -> amenity bit
+LABEL_IDS: Dict[str, int] = {
+    fold(label): bit
+    for bit, (_, labels) in enumerate(VOCABULARY)
+    for words in labels.values()
+    for label in words
+}
+
+# Every label in one alternation, longest first so "swimming pool" wins over "pool"
+LABEL_RE = re.compile(
+    r"(?<!\w)(" + "|".join(re.escape(label) for label in sorted(LABEL_IDS, key=len, reverse=True)) + r")(?!\w)"
+)
+
+
+def amenity_mask(names: Iterable[str]) -> int:
+    """Mask of canonical amenity names (as stored in the session criteria)."""
+    mask = 0
+    for name in names:
+        bit = AMENITY_IDS.get(name)
+        if bit is None:
+            bit = LABEL_IDS.get(fold(name))
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+@lru_cache(maxsize=4096)
+def _label_bit(label: str) -> int:
+    # Catalogs repeat the same few labels on every listing: fold each one once
+    bit = LABEL_IDS.get(fold(label))
+    return -1 if bit is None else bit
+
+
+def property_mask(prop: Dict) -> int:
+    """Mask of a listing's amenities, from its labels in every language."""
+    amenities = prop.get('amenities') or ()
+    labels = [label for labels in amenities.values() for label in labels] if isinstance(amenities, Mapping) else amenities
+    mask = 0
+    for label in labels:
+        bit = _label_bit(str(label))
+        if bit < 0:
+            logging.debug(f"Unknown amenity {label!r} in property {prop.get('id')}")
+            continue
+        mask |= 1 << bit
+    return mask
+
+
+def amenity_names(mask: int) -> List[str]:
+    return [name for bit, (name, _) in enumerate(VOCABULARY) if mask >> bit & 1]
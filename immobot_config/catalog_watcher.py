@@ -0,0 +1,88 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Optional, Tuple
+
+from immobot_config.database import PropertyDatabase
+
+
+class CatalogWatcher:
+    """
+    Background thread that reloads the catalog when its JSON file changes.
+
+    Every `interval` seconds the file's mtime and size are compared with the
+    last poll; when they differ the content is hashed, and only a new hash
+    triggers a parse and `PropertyDatabase.apply_catalog`. With `use_hash`
+    the content is hashed on every poll, for filesystems with coarse mtimes.
+    Parsing happens on this thread, never on a request.
+    """
+
+    def __init__(self, database: PropertyDatabase, interval: float = 5.0, use_hash: bool = False):
+        self.database = database
+        self.interval = interval
+        self.use_hash = use_hash
+        # Start from the file the served catalog was loaded from, not from the
+        # file as it is now: a worker forked after the file changed still
+        # serves the catalog its parent loaded, and must reload it
+        self._stat: Optional[Tuple[int, int]] = database.source_stat
+        # Without use_hash the first change is always reloaded, later ones only if the content
+        # differs. The file can only be hashed for the digest while it is the one that was loaded.
+        self._digest: Optional[str] = (
+            self._read()[1] if use_hash and self._stat and self._stat == self._file_stat() else None
+        )
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _file_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.database.file_path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _read(self) -> Tuple[bytes, str]:
+        with open(self.database.file_path, 'rb') as f:
+            raw = f.read()
+        return raw, hashlib.sha256(raw).hexdigest()
+
+    def check(self) -> bool:
+        """Poll the file once, returns True if a new catalog generation was published."""
+        stat = self._file_stat()
+        if stat is None or (stat == self._stat and not self.use_hash):
+            return False
+        self._stat = stat
+        raw, digest = self._read()
+        if digest == self._digest:
+            return False
+        self._digest = digest
+        try:
+            properties = json.loads(raw)
+        except ValueError as e:
+            # Probably caught mid-write; the next change will be picked up
+            logging.warning(f"Catalog {self.database.file_path} is not valid JSON, keeping current catalog: {e}")
+            return False
+        generation = self.database.apply_catalog(properties, stat)
+        # The next start loads this catalog from the snapshot instead of the JSON
+        self.database.save_snapshot(generation, properties, stat)
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logging.exception("Catalog reload failed, keeping current catalog")
+
+    def start(self) -> "CatalogWatcher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="immobot-catalog-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,130 @@
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Other names users type for the catalog's cities: Arabic, French and
+# English spellings, Darija transliterations and common abbreviations.
+ALIASES: Dict[str, List[str]] = {
+    "casablanca": ["الدار البيضاء", "الدارالبيضاء", "البيضاء", "كازا", "كازابلانكا", "casa", "dar lbida",
+                   "dar el beida", "darbida", "cazablanca", "kaza"],
+    "rabat": ["الرباط", "رباط", "rbat", "ribat"],
+    "marrakech": ["مراكش", "marrakesh", "marrakch", "mrakch", "marakech", "kech", "rakech"],
+    "tanger": ["طنجة", "tangier", "tangiers", "tanja"],
+    "fes": ["فاس", "fès", "fez", "fass"],
+    "agadir": ["أكادير", "اكادير", "agadyr", "gadir"],
+    "meknes": ["مكناس", "meknès", "mknas", "miknas"],
+    "oujda": ["وجدة", "ujda", "wjda"],
+    "kenitra": ["القنيطرة", "قنيطرة", "knitra", "kénitra"],
+    "tetouan": ["تطوان", "tétouan", "tetuan", "ttwan"],
+    "sale": ["سلا", "salé", "sla"],
+    "mohammedia": ["المحمدية", "mohamedia", "mohammadia", "fdala"],
+    "el jadida": ["الجديدة", "jdida", "eljadida"],
+    "essaouira": ["الصويرة", "souira", "mogador"],
+    "nador": ["الناظور", "ناظور", "nadour"],
+    "beni mellal": ["بني ملال", "benimellal", "bni mellal"],
+}
+
+# Arabic letter variants folded together (hamza forms, taa marbuta, alif maqsura)
+_ARABIC_FOLD = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ة": "ه", "ى": "ي", "ـ": None})
+_NOT_LETTER = re.compile(r"[^\w]|[\d_]")
+_WORD = re.compile(r"[^\W\d_]+")
+
+
+def normalize_key(text: str) -> str:
+    """
+    Spelling-insensitive key of a city name: lowercase, accents and Arabic
+    diacritics removed, Arabic letter variants folded, spaces and
+    punctuation dropped ("Fès" -> "fes", "الدار البيضاء" -> "الدارالبيضاء").
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NOT_LETTER.sub("", stripped.translate(_ARABIC_FOLD))
+
+
+def _trigrams(key: str) -> List[str]:
+    padded = f"  {key} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class CityResolver:
+    """
+    Map whatever the user typed to one of the catalog's cities.
+
+    Keys of the catalog cities and of their aliases are normalized once, and
+    every key is filed under its character trigrams. A lookup is an exact key
+    match, or else the key sharing the most trigrams (Dice coefficient of at
+    least `min_score`), so typos like "Casablanka" still resolve. Returns the
+    city as the search index spells it (normalize_city of the catalog value).
+    """
+
+    def __init__(self, cities: Iterable[str], aliases: Optional[Dict[str, List[str]]] = None,
+                 min_score: float = 0.6):
+        self.min_score = min_score
+        self._canonical: Dict[str, str] = {}
+        self._grams: List[int] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._keys: List[str] = []
+
+        by_key = {normalize_key(city): city for city in cities if city}
+        for key, city in by_key.items():
+            self._add(key, city)
+        for name, alias_list in (ALIASES if aliases is None else aliases).items():
+            city = by_key.get(normalize_key(name))
+            if city is None:
+                continue  # Not in this catalog: resolving to it would never match
+            for alias in alias_list:
+                self._add(normalize_key(alias), city)
+
+    def __len__(self) -> int:
+        return len(set(self._canonical.values()))
+
+    def _add(self, key: str, city: str) -> None:
+        if not key or key in self._canonical:
+            return
+        self._canonical[key] = city
+        key_id = len(self._keys)
+        self._keys.append(key)
+        grams = set(_trigrams(key))
+        self._grams.append(len(grams))
+        for gram in grams:
+            self._postings[gram].append(key_id)
+
+    def _best(self, key: str) -> Tuple[Optional[str], float]:
+        city = self._canonical.get(key)
+        if city is not None:
+            return city, 1.0
+        grams = set(_trigrams(key))
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for key_id in self._postings.get(gram, ()):
+                shared[key_id] += 1
+        best_id, best_score = None, 0.0
+        for key_id, count in shared.items():
+            score = 2 * count / (len(grams) + self._grams[key_id])
+            if score > best_score:
+                best_id, best_score = key_id, score
+        if best_id is None or best_score < self.min_score:
+            return None, best_score
+        return self._canonical[self._keys[best_id]], best_score
+
+    def resolve(self, text: str) -> Optional[str]:
+        """Best city for a single name, None if nothing is close enough."""
+        return self._best(normalize_key(text))[0]
+
+    def find(self, text: str, max_words: int = 3) -> Optional[str]:
+        """
+        Best city mentioned anywhere in `text`: every run of up to `max_words`
+        consecutive words is tried, so multi-word names ("الدار البيضاء",
+        "el jadida") are found without a preposition in front of them.
+        """
+        words = _WORD.findall(text)
+        best_city, best_score = None, 0.0
+        for start in range(len(words)):
+            for end in range(start + 1, min(len(words), start + max_words) + 1):
+                city, score = self._best(normalize_key("".join(words[start:end])))
+                if city is not None and score > best_score:
+                    best_city, best_score = city, score
+                    if score == 1.0:
+                        return city
+        return best_city
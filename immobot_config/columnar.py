@@ -0,0 +1,141 @@
+import logging
+from collections.abc import Sequence
+from typing import Dict, List, Optional
+
+from immobot_config.amenities import property_mask
+from immobot_config.query import Query, normalize_city
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency, only needed for this backend
+    np = None
+
+# Fields held only as NumPy columns; everything else (including the display
+# form of the city, which is also encoded as a city code) goes to side tables
+COLUMN_FIELDS = frozenset({'price', 'rooms', 'available'})
+
+_MISSING = object()
+
+
+class ColumnarIndex:
+    """
+    Column-oriented catalog evaluated with NumPy boolean masks.
+
+    price, rooms, availability, a city code and the amenity bitmask are NumPy arrays; the other
+    fields (text, lists, nested translations) live in one plain list per field.
+    A search combines the criteria into a single mask and only the matching
+    rows are turned back into property dicts.
+    """
+
+    def __init__(self, properties: Sequence[Dict]):
+        if np is None:
+            raise ImportError("The columnar catalog backend requires numpy (pip install numpy)")
+
+        count = len(properties)
+        prices = []
+        rooms = np.zeros(count, dtype=np.int64)
+        available = np.zeros(count, dtype=bool)
+        city_codes = np.zeros(count, dtype=np.int32)
+        amenity_masks = np.zeros(count, dtype=np.uint64)
+        self.city_ids: Dict[str, int] = {}
+        self.cities: List[str] = []
+        self.side_tables: Dict[str, List] = {}
+
+        for row, prop in enumerate(properties):
+            for key, value in prop.items():
+                if key in COLUMN_FIELDS:
+                    continue
+                table = self.side_tables.get(key)
+                if table is None:
+                    table = self.side_tables[key] = [_MISSING] * count
+                table[row] = value
+            try:
+                price = prop['price']
+                if not isinstance(price, (int, float)) or isinstance(price, bool):
+                    raise TypeError(f"price {price!r} is not a number")
+                if not isinstance(prop['rooms'], int):
+                    raise TypeError(f"rooms {prop['rooms']!r} is not an integer")
+                rooms[row] = prop['rooms']
+                city = normalize_city(prop['city'])
+            except (KeyError, ValueError, TypeError) as e:
+                # Malformed rows stay unavailable so no search returns them
+                logging.warning(f"Skipping malformed property {prop.get('id')}: {e}")
+                prices.append(0)
+                continue
+            prices.append(price)
+            available[row] = bool(prop.get('available', True))
+            code = self.city_ids.get(city)
+            if code is None:
+                code = self.city_ids[city] = len(self.cities)
+                self.cities.append(city)
+            city_codes[row] = code
+            amenity_masks[row] = property_mask(prop)
+
+        # Keep integer prices integral so rendered listings look the same
+        all_int = all(isinstance(p, int) for p in prices)
+        self.price = np.array(prices, dtype=np.int64 if all_int else np.float64)
+        self.rooms = rooms
+        self.available = available
+        self.city_code = city_codes
+        self.amenities = amenity_masks
+        self.properties = ColumnarRows(self)
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    def city_names(self) -> List[str]:
+        """Normalized cities of the catalog."""
+        return list(self.cities)
+
+    def mask(self, query: Query):
+        mask = self.available.copy()
+        if query.budget is not None:
+            mask &= self.price <= query.budget
+        if query.rooms is not None:
+            mask &= self.rooms == query.rooms
+        if query.city is not None:
+            code = self.city_ids.get(query.city)
+            if code is None:
+                return np.zeros_like(mask)
+            mask &= self.city_code == code
+        if query.amenities:
+            need = np.uint64(query.amenities)
+            mask &= (self.amenities & need) == need
+        return mask
+
+    def materialize(self, rows) -> List[Dict]:
+        rows = list(rows)
+        prices = self.price[rows].tolist()
+        rooms = self.rooms[rows].tolist()
+        available = self.available[rows].tolist()
+        result = []
+        for i, row in enumerate(rows):
+            prop = {'price': prices[i], 'rooms': rooms[i], 'available': available[i]}
+            for key, table in self.side_tables.items():
+                value = table[row]
+                if value is not _MISSING:
+                    prop[key] = value
+            result.append(prop)
+        return result
+
+    def find(self, query: Query, limit: Optional[int] = None) -> List[Dict]:
+        return self.materialize(np.flatnonzero(self.mask(query))[:limit])
+
+
+class ColumnarRows(Sequence):
+    """Read-only list view that builds property dicts from the columns on access."""
+
+    def __init__(self, index: ColumnarIndex):
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self._index.materialize(range(len(self))[item])
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("property index out of range")
+        return self._index.materialize([item])[0]
@@ -1,41 +1,305 @@
+import gc
 import json
-from typing import Dict, List
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
 from dataclasses import dataclass
-from datetime import datetime
-
-@dataclass
-class Property:
-    id: str
-    rooms: int
-    price: float
-    currency: str
-    city: str
-    available: bool
-    address: str
-    amenities: List[str]
-    photos: List[str]
-    description: Dict[str, str]
-    agent: int
-    created_at: str = datetime.now().isoformat()
+
+from immobot_config.query import PropertyIndex, normalize_criteria
+from immobot_config.cities import CityResolver
+from immobot_config.amenities import amenity_mask, property_mask
+from immobot_config import snapshot
+from immobot_config.records import Property, dump_records, load_records, to_records
+
+def _hash_index(database: "PropertyDatabase", properties: Optional[List[Dict]]):
+    # The index keeps the listings it is given: store them as compact records
+    return PropertyIndex(to_records(properties if properties is not None else database._load_database()))
+
+
+def _columnar_index(database: "PropertyDatabase", properties: Optional[List[Dict]]):
+    # Imported lazily: numpy is only required when this backend is selected
+    from immobot_config.columnar import ColumnarIndex
+    return ColumnarIndex(properties if properties is not None else database._load_database())
+
+
+def _sqlite_index(database: "PropertyDatabase", properties: Optional[List[Dict]]):
+    from immobot_config.sqlite_store import (
+        SCHEMA_VERSION, SqliteIndex, import_catalog, import_catalog_file, schema_version,
+    )
+    db_path = database.sqlite_path
+    if properties is not None:
+        import_catalog(properties, db_path)
+    elif (not os.path.exists(db_path) or os.path.getmtime(db_path) < os.path.getmtime(database.file_path)
+          or schema_version(db_path) != SCHEMA_VERSION):
+        # Streamed, the JSON catalog is never fully loaded in memory
+        logging.info(f"Importing {database.file_path} into {db_path}")
+        import_catalog_file(database.file_path, db_path)
+    return SqliteIndex(db_path)
+
+
+# Catalog backends, selected with the CATALOG_BACKEND environment variable.
+# Each factory builds an index from `properties`, or from the catalog file when it is None.
+BACKENDS = {
+    'index': _hash_index,
+    'columnar': _columnar_index,
+    'sqlite': _sqlite_index,
+}
+
+
+# Backends whose index is stored in the catalog snapshot and restored without
+# being rebuilt; the others only get the parsed listings back from it.
+SNAPSHOT_LOADERS = {
+    'index': lambda properties, state: PropertyIndex.from_snapshot_state(load_records(properties), state),
+}
+
+# Backends holding the listings as Property records (see records.py); the
+# others keep their own copy of the rows
+RECORD_BACKENDS = {'index'}
+
+
+@contextmanager
+def _gc_paused():
+    # Loading creates hundreds of thousands of containers that all survive:
+    # collections triggered along the way would only scan them again and again
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+@dataclass(frozen=True)
+class CatalogGeneration:
+    """
+    One immutable version of the catalog and its index.
+
+    `properties` is a list of row slots; a slot is None when its listing was
+    removed by a reload. `positions` maps property id -> row, or is None when
+    ids are missing or duplicated (reloads then rebuild everything).
+    """
+    number: int
+    properties: Sequence[Optional[Dict]]
+    index: object
+    positions: Optional[Dict[str, int]]
+
+
+def _positions(properties: Sequence[Optional[Dict]]) -> Optional[Dict[str, int]]:
+    positions = {}
+    for row, prop in enumerate(properties):
+        if prop is None:
+            continue
+        prop_id = prop.get('id')
+        if prop_id is None or prop_id in positions:
+            return None
+        positions[prop_id] = row
+    return positions
+
 
 class PropertyDatabase:
-    def __init__(self, file_path: str = './rooms_database.json'):
-        self.file_path = file_path
-        self.properties = self._load_database()
+    # Rebuild from scratch once more than this share of the row slots is empty
+    MAX_EMPTY_SLOTS = 0.5
+
+    def __init__(self, file_path: Optional[str] = None, properties: Optional[List[Dict]] = None,
+                 backend: Optional[str] = None, sqlite_path: Optional[str] = None,
+                 snapshot_path: Optional[str] = None):
+        self.file_path = file_path = file_path or os.getenv("CATALOG_PATH", './rooms_database.json')
+        self.backend = backend or os.getenv("CATALOG_BACKEND", "index")
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown catalog backend {self.backend!r}, expected one of {sorted(BACKENDS)}")
+        self.sqlite_path = sqlite_path or os.getenv("CATALOG_SQLITE_PATH") or os.path.splitext(file_path)[0] + '.sqlite'
+        self.snapshot_path = (snapshot_path or os.getenv("CATALOG_SNAPSHOT_PATH")
+                              or os.path.splitext(file_path)[0] + '.snapshot')
+        self._reload_lock = threading.Lock()
+        # (mtime_ns, size) of the JSON file the current catalog was read from,
+        # None when it was given in memory; CatalogWatcher starts from it
+        self.source_stat: Optional[snapshot.SourceStat] = None
+        start = time.perf_counter()
+        with _gc_paused():
+            self._generation, source = self._initial_generation(properties)
+        logging.info(
+            f"Catalog loaded from {source} in {(time.perf_counter() - start) * 1000:.0f}ms: "
+            f"{len(self._generation.properties)} listings, {self.backend} backend"
+        )
+        self._city_resolver = None
+
+    def _initial_generation(self, properties: Optional[List[Dict]]):
+        """First catalog generation and where it was loaded from."""
+        if properties is not None:
+            return self._build_generation(1, properties), "memory"
+        # Taken before reading: a change made meanwhile is seen by the watcher
+        self.source_stat = source = snapshot.source_stat(self.file_path)
+        if self.backend == 'sqlite':
+            # The SQLite catalog already is a parsed copy of the JSON file
+            return self._build_generation(1, None), self.sqlite_path
+        payload = snapshot.read_snapshot(self.snapshot_path, source)
+        if payload is not None:
+            try:
+                return self._generation_from_snapshot(payload), self.snapshot_path
+            except (KeyError, TypeError, ValueError) as e:
+                logging.warning(f"Catalog snapshot {self.snapshot_path} is unusable, rebuilding it: {e}")
+        properties = self._load_database()
+        generation = self._build_generation(1, properties)
+        self.save_snapshot(generation, properties, source)
+        return generation, self.file_path
+
+    def _generation_from_snapshot(self, payload: Dict) -> CatalogGeneration:
+        if payload['backend'] != self.backend:
+            raise ValueError(f"written for the {payload['backend']} backend")
+        loader = SNAPSHOT_LOADERS.get(self.backend)
+        if loader is None:
+            return self._build_generation(1, payload['properties'])
+        index = loader(payload['properties'], payload['index'])
+        rows = index.properties
+        return CatalogGeneration(1, rows, index, _positions(rows))
+
+    def save_snapshot(self, generation: CatalogGeneration, properties: List[Dict],
+                      source: Optional[snapshot.SourceStat]) -> None:
+        """
+        Write the catalog snapshot for `generation`, built from `properties`
+        as parsed from the JSON file whose (mtime_ns, size) was `source`.
+        Backends in SNAPSHOT_LOADERS store their index along with its rows.
+        Failures are logged: the next start then parses the JSON again.
+        """
+        if self.backend == 'sqlite' or source is None:
+            return
+        start = time.perf_counter()
+        if self.backend in SNAPSHOT_LOADERS:
+            payload = {'backend': self.backend,
+                       'properties': dump_records(generation.properties),
+                       'index': generation.index.snapshot_state()}
+        else:
+            payload = {'backend': self.backend, 'properties': properties, 'index': None}
+        try:
+            snapshot.write_snapshot(self.snapshot_path, payload, source)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not write catalog snapshot {self.snapshot_path}: {e}")
+            return
+        logging.info(f"Catalog snapshot written to {self.snapshot_path} in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def _build_generation(self, number: int, properties: Optional[List[Dict]]) -> CatalogGeneration:
+        index = BACKENDS[self.backend](self, properties)
+        # The columnar and SQLite backends keep their own copy of the rows
+        rows = index.properties
+        positions = _positions(rows) if hasattr(index, 'updated') else None
+        return CatalogGeneration(number, rows, index, positions)
+
+    @property
+    def generation(self) -> CatalogGeneration:
+        return self._generation
+
+    @property
+    def properties(self) -> Sequence[Optional[Dict]]:
+        return self._generation.properties
+
+    @property
+    def index(self):
+        return self._generation.index
+
+    @property
+    def city_resolver(self) -> CityResolver:
+        """Resolver over the current catalog's cities, rebuilt after a reload changes the catalog."""
+        generation = self._generation
+        cached = self._city_resolver
+        if cached is None or cached[0] != generation.number:
+            cached = self._city_resolver = (generation.number, CityResolver(generation.index.city_names()))
+        return cached[1]
+
+    def resolve_city(self, text: str) -> Optional[str]:
+        """The catalog city `text` refers to, as the search index spells it, or None."""
+        return self.city_resolver.find(text)
 
     def _load_database(self) -> List[Dict]:
             with open(self.file_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
 
-    def find_properties(self, criteria: Dict) -> List[Dict]:
+    def reload(self) -> CatalogGeneration:
+        """Re-read the JSON file and swap in the new catalog."""
+        source = snapshot.source_stat(self.file_path)
+        return self.apply_catalog(self._load_database(), source)
+
+    def apply_catalog(self, properties: List[Dict],
+                      source: Optional[snapshot.SourceStat] = None) -> CatalogGeneration:
+        """
+        Diff `properties` against the current catalog by id and publish a new
+        generation. Unchanged listings keep their row, removed ones leave an
+        empty slot and new ones are appended, so only the index buckets of the
+        changed listings are rebuilt. The swap is a single reference
+        assignment: searches already running keep reading the old generation.
+        `source` is the (mtime_ns, size) of the file `properties` were read from.
+        """
+        if self.backend in RECORD_BACKENDS:
+            properties = to_records(properties)
+        with self._reload_lock:
+            old = self._generation
+            number = old.number + 1
+            new_positions = _positions(properties)
+            if old.positions is None or new_positions is None or not hasattr(old.index, 'updated'):
+                generation = self._build_generation(number, properties)
+            else:
+                slots = list(old.properties)
+                removed = {}
+                added = []
+                for prop_id, row in old.positions.items():
+                    if prop_id not in new_positions:
+                        removed[row] = slots[row]
+                        slots[row] = None
+                positions = {pid: row for pid, row in old.positions.items() if pid in new_positions}
+                for prop in properties:
+                    row = positions.get(prop['id'])
+                    if row is None:
+                        positions[prop['id']] = row = len(slots)
+                        slots.append(prop)
+                        added.append(row)
+                    elif slots[row] != prop:
+                        removed[row] = slots[row]
+                        slots[row] = prop
+                        added.append(row)
+
+                if len(slots) - len(positions) > self.MAX_EMPTY_SLOTS * len(slots):
+                    generation = self._build_generation(number, properties)
+                else:
+                    index = old.index.updated(slots, removed, added)
+                    generation = CatalogGeneration(number, slots, index, positions)
+                logging.info(
+                    f"Catalog generation {number}: {len(added)} listings added or changed, "
+                    f"{len(removed) - len(set(removed) & set(added))} removed"
+                )
+            self._generation = generation
+            self.source_stat = source
+            return generation
+
+    def find_properties(self, criteria: Dict, limit: Optional[int] = None,
+                        generation: Optional[CatalogGeneration] = None) -> List[Dict]:
+        """
+        Indexed search, same results as a full scan with `_matches_criteria`.
+        `limit` keeps only the first matches in catalog order, and
+        `generation` pins the search to a catalog version the caller already holds.
+        """
+        try:
+            query = normalize_criteria(criteria)
+        except (ValueError, TypeError) as e:
+            logging.warning(f"Invalid search criteria {criteria!r}: {e}")
+            return []
+        return (generation or self._generation).index.find(query, limit)
+
+    def _scan_properties(self, criteria: Dict) -> List[Dict]:
+        """Reference linear scan, kept for benchmarks and consistency checks."""
         matches = []
         for prop in self.properties:
-            if self._matches_criteria(prop, criteria):
+            if prop is not None and self._matches_criteria(prop, criteria):
                 matches.append(prop)
         return matches
 
     def _matches_criteria(self, property: Dict, criteria: Dict) -> bool:
         try:
+            if not property.get('available', True):
+                return False
+
             if criteria.get('budget') and property['price'] > float(criteria['budget']):
                 return False
             
@@ -44,8 +308,12 @@ class PropertyDatabase:
             
             if criteria.get('city') and property['city'].lower() != str(criteria['city']).lower():
                 return False
+
+            need = amenity_mask(criteria.get('amenities') or ())
+            if need and property_mask(property) & need != need:
+                return False
             
             return True
         except (ValueError, TypeError) as e:
-            print(f"Erreur dans _matches_criteria : {e}")
+            logging.warning(f"Invalid search criteria {criteria!r} for property {property.get('id')}: {e}")
             return False
\ No newline at end of file
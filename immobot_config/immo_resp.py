@@ -1,101 +1,136 @@
+import logging
+import os
 from typing import Dict, Optional
-from immobot_config.language import LanguageManager, Language
+from immobot_config.language import LanguageManager, Language, MessageAnalysis
 
 from immobot_config.database import PropertyDatabase
+from immobot_config.session import Session
+from immobot_config.render_cache import RenderCache
+from immobot_config.ranking import RANKINGS, top_k
+from immobot_config.metrics import ERRORS, MESSAGES, timed
 
 class immoBot:
-    def __init__(self):
-        self.lang_manager = LanguageManager()
-        self.database = PropertyDatabase()
-        self.current_state = "GREETING"
-        self.current_language = Language.FR
-        self.user_info = {
-            'budget': None,
-            'rooms': None,
-            'city': None,
-            'amenities': []
-        }
-    def process_message(self, message: str) -> str:
+    """
+    Dialogue manager shared by every conversation.
+
+    The bot itself only holds the shared LanguageManager and PropertyDatabase;
+    the per-user state lives in a `Session` passed to `process_message`.
+    """
+    # WhatsApp text messages are limited to 4096 characters, keep headroom for _format_response
+    MAX_MESSAGE_CHARS = 4000
+
+    def __init__(self, database: Optional[PropertyDatabase] = None, lang_manager: Optional[LanguageManager] = None,
+                 render_cache_size: Optional[int] = None, page_size: Optional[int] = None,
+                 ranking: Optional[str] = None):
+        self.lang_manager = lang_manager or LanguageManager()
+        self.database = database or PropertyDatabase()
+        if render_cache_size is None:
+            render_cache_size = int(os.getenv("RENDER_CACHE_SIZE", "10000"))
+        self.render_cache = RenderCache(render_cache_size)
+        # Listings per results page, and how they are ordered (see ranking.RANKINGS)
+        self.page_size = page_size or int(os.getenv("SEARCH_PAGE_SIZE", "5"))
+        self.ranking = RANKINGS[ranking or os.getenv("SEARCH_RANKING", "budget_recency")]
+
+    def process_message(self, message: str, session: Session) -> str:
         try:
-            # Detect language at the start of conversation
-            if self.current_state == "GREETING":
-                self.current_language = self.lang_manager.detect_language(message)
+            # Detect language at the start of conversation, then extract entities in the same pass
+            state = session.current_state
+            detect = state == "GREETING"
+            with timed("nlu"):
+                analysis = self.lang_manager.analyze(message, None if detect else session.current_language)
+            session.current_language = analysis.language
+            MESSAGES.labels(state, analysis.language.value).inc()
 
-            response = self._handle_state(message)
-            return self._format_response(response)
+            response = self._handle_state(analysis, session, message)
+            return self._format_response(response, session.current_language)
 
         except Exception as e:
-            print(f"Error: {str(e)}")
-            return self.lang_manager.get_message("error", self.current_language)
-
-    def _handle_state(self, message: str) -> str:
-        if self.current_state == "GREETING":
-            if self.lang_manager.is_greeting(message):
-                self.current_state = "ASK_ROOMS"
-                return self.lang_manager.get_message("greeting", self.current_language)
-            return self.lang_manager.get_message("no_ask_rooms", self.current_language)
-
-        elif self.current_state == "ASK_ROOMS":
-            rooms = self.lang_manager.extract_number(message, self.current_language)
+            ERRORS.labels("dialogue").inc()
+            logging.exception(f"Failed to process message: {e}")
+            return self.lang_manager.get_message("error", session.current_language)
+
+    def _handle_state(self, analysis: MessageAnalysis, session: Session, message: str) -> str:
+        # Amenities can be asked for in any answer ("2 chambres avec parking"),
+        # the greeting has none worth scanning for
+        amenities = analysis.amenities if session.current_state != "GREETING" else ()
+        if amenities:
+            wanted = session.user_info.setdefault('amenities', [])
+            wanted.extend(name for name in amenities if name not in wanted)
+
+        if session.current_state == "GREETING":
+            if analysis.is_more and session.cursor:
+                # Next page of the last search, in the language it was made in
+                session.current_language = Language(session.cursor['language'])
+                return self.results_page(session)
+            if analysis.is_greeting:
+                session.cursor = None
+                session.current_state = "ASK_ROOMS"
+                return self.lang_manager.get_message("greeting", session.current_language)
+            return self.lang_manager.get_message("no_ask_rooms", session.current_language)
+
+        elif session.current_state == "ASK_ROOMS":
+            rooms = analysis.rooms
             if rooms:
-                self.user_info['rooms'] = rooms
-                self.current_state = "ASK_BUDGET"
-                return self.lang_manager.get_message("ask_budget", self.current_language)
-            return self.lang_manager.get_message("no_ask_rooms", self.current_language)
+                session.user_info['rooms'] = rooms
+                session.current_state = "ASK_BUDGET"
+                return self.lang_manager.get_message("ask_budget", session.current_language)
+            return self.lang_manager.get_message("no_ask_rooms", session.current_language)
 
-        elif self.current_state == "ASK_BUDGET":
-            budget = self.lang_manager.extract_budget(message)
+        elif session.current_state == "ASK_BUDGET":
+            budget = analysis.budget
             if budget:
-                self.user_info['budget'] = budget
-                self.current_state = "ASK_CITY"
-                return self.lang_manager.get_message("ask_city", self.current_language)
-            return self.lang_manager.get_message("no_ask_budget", self.current_language)
-
-        elif self.current_state == "ASK_CITY":
-            # Extract city from message
-            city = self.lang_manager.extract_city(message, self.current_language)  # Ajout du paramètre language
+                session.user_info['budget'] = budget
+                session.current_state = "ASK_CITY"
+                return self.lang_manager.get_message("ask_city", session.current_language)
+            return self.lang_manager.get_message("no_ask_budget", session.current_language)
+
+        elif session.current_state == "ASK_CITY":
+            # City extracted from the message, resolved to the catalog's spelling
+            # (aliases, Arabic script and typos included); the whole message is
+            # searched when no preposition introduced the city
+            city = self.database.resolve_city(analysis.city or message) or analysis.city
             if city:
-                self.user_info['city'] = city
-                return self.search_properties()
-            return self.lang_manager.get_message("no_ask_city", self.current_language)
+                session.user_info['city'] = city
+                return self.search_properties(session)
+            return self.lang_manager.get_message("no_ask_city", session.current_language)
 
 
-    def _format_response(self, response: str) -> str:
+    def _format_response(self, response: str, language: Language) -> str:
         """Adds appropriate emojis and formatting based on language"""
-        if self.current_language == Language.DA:
+        if language == Language.DA:
             # Add more friendly emojis for darija responses
             return response.replace("Error", "Mochkil 🤔").replace("Sorry", "Smeh liya 😕")
         return response
-    def format_property(self, prop: Dict) -> str:
+    def format_property(self, prop: Dict, language: Language) -> str:
         currency = "DH" if prop['currency'] == "MAD" else "$"
         
-        if self.current_language == Language.DA:
+        if language == Language.DA:
             return  (
                 f"kayn had dar fiha {prop['rooms']} byout ojat f {prop['city']}\n"
                 f" l'hay:  {prop['address']}\n"
                 f"💰 Taman dylha : {prop['price']}{currency}\n"
                 f"✨ oKayn fiha hta {', '.join(prop['amenities']['da'])}\n"
-                f"📝hado m3lomat idafya 3liha: {prop['description']["da"]}\n"
+                f"📝hado m3lomat idafya 3liha: {prop['description']['da']}\n"
                 f"📸 hado tsawr dyal dar mn ldakhl: {', '.join(prop['photos'])}\n"
                 f"hada num dyal l'wakil {prop['agent']}\n"
                 )
-        elif self.current_language == Language.FR:
+        elif language == Language.FR:
             return (
                 f"une appartement avec {prop['rooms']} chambres à {prop['city']}\n"
                 f"Quartier: {prop['address']}\n"
                 f"💰 Prix: {prop['price']}{currency}\n"
                 f"✨ Il est équipé de: {', '.join(prop['amenities']['fr'])}\n"
-                f"📝voila plus de détails: {prop['description']["fr"]}\n"
+                f"📝voila plus de détails: {prop['description']['fr']}\n"
                 f"📸 voila des photo de l'appartement: {', '.join(prop['photos'])}\n"
                 f"voila le numéro de l'agent {prop.get('agent', 'non disponible')}\n"
             )
-        elif self.current_language == Language.EN:
+        elif language == Language.EN:
             return (
                 f"I found a property with {prop['rooms']} rooms in {prop['city']}\n"
                 f"📍 Area: {prop['address']}\n"
                 f"💰 Price: {prop['price']}{currency}\n"
                 f"✨ Amenities: {', '.join(prop['amenities']['en'])}\n"
-                f"📝 Additional details:  {prop['description']["en"]}\n"
+                f"📝 Additional details:  {prop['description']['en']}\n"
                 f"📸 Here are some photos of the property: {', '.join(prop['photos'])}\n"
                 f"here is the agent number {prop.get('agent', 'non disponible')}\n"
             )
@@ -105,36 +140,72 @@ class immoBot:
                 f"📍 الحي: {prop['address']}\n"
                 f"💰 السعر: {prop['price']}{currency}\n"
                 f"✨ المرافق: {', '.join(prop['amenities']['ar'])}\n"
-                f"📝 تفاصيل إضافية: {prop['description']["ar"]}\n"
+                f"📝 تفاصيل إضافية: {prop['description']['ar']}\n"
                 f"📸 بعض الصور للعقار:  {', '.join(prop['photos'])}\n"
                 f"هذا رقم الوكيل {prop.get('agent', 'non disponible')}\n"
             )
         
-    def search_properties(self) -> str:
-        properties = self.database.find_properties(self.user_info)
-        if not properties:
-            self.reset_state()
-            return f"{self.lang_manager.get_message("no_results", self.current_language)}"
+    def render_property(self, prop: Dict, language: Language, generation: int) -> str:
+        """format_property, cached per (property id, language) for the given catalog generation."""
+        prop_id = prop.get('id')
+        if prop_id is None:
+            return self.format_property(prop, language)
+        return self.render_cache.get_or_render(
+            (prop_id, language), generation, lambda: self.format_property(prop, language)
+        )
+
+    def search_properties(self, session: Session) -> str:
+        """Start a new search from the collected criteria and return its first page."""
+        criteria = dict(session.user_info)
+        self.reset_state(session)
+        session.cursor = {'criteria': criteria, 'offset': 0, 'language': session.current_language.value}
+        return self.results_page(session)
+
+    def results_page(self, session: Session) -> str:
+        """
+        Render the next page of the search held in `session.cursor`.
+
+        Only the best `offset + page_size` matches are selected (heap top-k)
+        and only the listings that fit in one WhatsApp message are rendered;
+        the cursor then moves past them, or is cleared after the last page.
+        """
+        cursor = session.cursor
+        language = Language(cursor['language'])
+        generation = self.database.generation
+        offset = cursor['offset']
+        with timed("search"):
+            matches = self.database.find_properties(cursor['criteria'], generation=generation)
+            if offset < len(matches):
+                ranked = top_k(matches, offset + self.page_size, cursor['criteria'], self.ranking)[offset:]
+        if offset >= len(matches):
+            session.cursor = None
+            return self.lang_manager.get_message("no_results", language)
+
+        header = self.lang_manager.get_message("results_header", language)
+        footer_room = len(self.lang_manager.get_message("results_more", language)) + 20
+        budget = self.MAX_MESSAGE_CHARS - len(header) - footer_room
+        listings = []
+        with timed("render"):
+            for prop in ranked:
+                text = self.render_property(prop, language, generation.number)
+                needed = len(text) + (2 if listings else 0)
+                if needed > budget:
+                    if listings:
+                        break
+                    # A single listing longer than a message is cut rather than skipped
+                    text = text[:budget - 1] + "…"
+                    needed = budget
+                listings.append(text)
+                budget -= needed
+
+        shown = offset + len(listings)
+        if shown < len(matches):
+            cursor['offset'] = shown
+            footer = self.lang_manager.get_message("results_more", language).format(shown=shown, total=len(matches))
         else:
-            response = []
-            for prop in properties:
-                response.append(self.format_property(prop))
-                self.reset_state()
-            if self.current_language == Language.EN:
-                return "Here are the properties that match your criteria:\n\n" + "\n\n".join(response) + "\nif you want to restart say okey"
-            elif self.current_language == Language.AR:
-                return "ها هي العقارات التي تتطابق مع معاييرك:\n\n" + "\n\n".join(response) + "\nاذا كنت تريد اعادة البداية قل حسنا"
-            elif self.current_language == Language.FR:
-                return "Voici les propriétés qui correspondent à vos critères:\n\n" + "\n\n".join(response) + "\nSi vous voulez recommencer, dites oui"
-
-            elif self.current_language == Language.DA:
-                return "hahoma les apparetement li 9it lik :\n\n" + "\n\n".join(response) + "\nlaknti baghi t3awd t9leb 9oliya safi "
-
-    def reset_state(self) -> None:
-        self.current_state = "GREETING"
-        self.user_info = {
-            'budget': None,
-            'rooms': None,
-            'city': None,
-            'amenities': []
-        }
+            session.cursor = None
+            footer = self.lang_manager.get_message("results_footer", language)
+        return header + "\n\n".join(listings) + footer
+
+    def reset_state(self, session: Session) -> None:
+        session.reset()
@@ -1,7 +1,9 @@
 from enum import Enum
-from typing import Dict, Optional
+from typing import Dict, List, NamedTuple, Optional, Tuple
 import re
 
+from immobot_config.amenities import LABEL_IDS, LABEL_RE, VOCABULARY, fold
+
 class Language(Enum):
     FR = "fr"
     EN = "en"
@@ -54,6 +56,24 @@ class LanguageManager:
             "ar": "عذراً، لا يوجد سكن يطابق معاييرك.",
             "da": "Smeh liya, mal9ina 7ta chi dar kifma bghiti."
         },
+        "results_header": {
+            "fr": "Voici les propriétés qui correspondent à vos critères:\n\n",
+            "en": "Here are the properties that match your criteria:\n\n",
+            "ar": "ها هي العقارات التي تتطابق مع معاييرك:\n\n",
+            "da": "hahoma les apparetement li 9it lik :\n\n"
+        },
+        "results_footer": {
+            "fr": "\nSi vous voulez recommencer, dites oui",
+            "en": "\nif you want to restart say okey",
+            "ar": "\nاذا كنت تريد اعادة البداية قل حسنا",
+            "da": "\nlaknti baghi t3awd t9leb 9oliya safi "
+        },
+        "results_more": {
+            "fr": "\n{shown} sur {total} affichés. Dites plus pour voir la suite, ou oui pour recommencer",
+            "en": "\nShowing {shown} of {total}. Say more to see the next ones, or okey to restart",
+            "ar": "\nتم عرض {shown} من {total}. قل المزيد لرؤية الباقي، أو حسنا لإعادة البداية",
+            "da": "\nwrina lik {shown} mn {total}. 9oliya zid bach nwrik lba9i, wla safi bach t3awd "
+        },
         "error": {
             "fr": "Une erreur s'est produite. Veuillez réessayer.",
             "en": "An error occurred. Please try again.",
@@ -69,68 +89,143 @@ class LanguageManager:
         "da": ["salam", "slm", "sabah lkhir", "labas","ok","wakha","safi"]
     }
 
+    # Ask for the next page of search results
+    MORE_WORDS = {
+        "fr": ["plus", "suite", "encore"],
+        "en": ["more", "next"],
+        "ar": ["المزيد", "مزيد", "التالي"],
+        "da": ["zid", "kter", "mazal"]
+    }
+
     # Mots clés pour détecter le darija
     DARIJA_WORDS = [
         "ch7al", "wa9t", "bghit", "kanqalleb","kan9lb", "3nd", "m3a", "dyal", "dyalk","slm","khasni"
         "kayn", "zwin", "zwina", "kbir", "kbira", "sghir", "sghira","salam", "slm", "sabah lkhir", "labas","ok","wakha","safi","ana",
     ]
 
+    FRENCH_PATTERN = r'\b(bonjour|salut|recherche|chambre|prix|slt|bnj|oui|je|tu|peut|jai)\b'
+
+    ROOMS_PATTERNS = {
+        "fr": r'(\d+)\s*(chambre?|chambres?|pièces?)',
+        "en": r'(\d+)\s*(for|rooms?|bedrooms?|bedroom?|room?|pieces?)',
+        "ar": r'(\d+)\s*(غرف|غرفة)',
+        "da": r'(\d+)\s*(bit|biyout|byout|chombrat|chambre|غرفة)'  # Ajout des mots en darija
+    }
+
+    # Support pour le darija ajouté (dh, derham, drahm)
+    BUDGET_PATTERN = r'(\d+)\s*(dollars?|dirham|dh|derham|drahm|usd|\$|درهم|دولار)'
+
+    # Up to three words of any script after the preposition ("في الدار البيضاء", "à el jadida")
+    CITY_PATTERN = r'(?<!\w)(?:in|a|at|for|dans|f|fi|fmdint|fmdinat|à|في|فى|ف)\s+([^\W\d_]+(?:[ \t]+[^\W\d_]+){0,2})'
+
+    # Compiled once at import instead of on every message.
+    # One alternation finds any Darija keyword in a single scan of the text.
+    _DARIJA_RE = re.compile("|".join(re.escape(word) for word in DARIJA_WORDS))
+    _ARABIC_RE = re.compile(r'[\u0600-\u06FF]')
+    _FRENCH_RE = re.compile(FRENCH_PATTERN)
+    _ALL_GREETINGS = frozenset(word for words in GREETINGS.values() for word in words)
+    _ALL_MORE_WORDS = frozenset(word for words in MORE_WORDS.values() for word in words)
+    _ROOMS_RES = {lang: re.compile(pattern) for lang, pattern in ROOMS_PATTERNS.items()}
+    _BUDGET_RE = re.compile(BUDGET_PATTERN)
+    _CITY_RE = re.compile(CITY_PATTERN, re.IGNORECASE)
+
     @staticmethod
-    def detect_language(message: str) -> Language:
-        message_lower = message.lower()
-        
+    def _detect(message_lower: str) -> Language:
         # Detect Darija
-        for word in LanguageManager.DARIJA_WORDS:
-            if word in message_lower:
-                return Language.DA
-                
+        if LanguageManager._DARIJA_RE.search(message_lower):
+            return Language.DA
+
         # Detect Arabic
-        if re.search(r'[\u0600-\u06FF]', message):
+        if LanguageManager._ARABIC_RE.search(message_lower):
             return Language.AR
-            
+
         # Detect French
-        french_patterns = r'\b(bonjour|salut|recherche|chambre|prix|slt|bnj|oui|je|tu|peut|jai)\b'
-        if re.search(french_patterns, message_lower):
+        if LanguageManager._FRENCH_RE.search(message_lower):
             return Language.FR
-            
+
         return Language.EN
 
+    @staticmethod
+    def detect_language(message: str) -> Language:
+        return LanguageManager._detect(message.lower())
+
     @staticmethod
     def get_message(key: str, lang: Language) -> str:
         return LanguageManager.TRANSLATIONS[key][lang.value]
 
     @staticmethod
     def is_greeting(message: str) -> bool:
-        msg_lower = message.lower().strip()
-        all_greetings = []
-        for greetings in LanguageManager.GREETINGS.values():
-            all_greetings.extend(greetings)
-        return msg_lower in all_greetings
+        return message.lower().strip() in LanguageManager._ALL_GREETINGS
 
     @staticmethod
-    def extract_number(message: str, lang: Language) -> Optional[int]:
-        patterns = {
-            "fr": r'(\d+)\s*(chambre?|chambres?|pièces?)',
-            "en": r'(\d+)\s*(for|rooms?|bedrooms?|bedroom?|room?|pieces?)',
-            "ar": r'(\d+)\s*(غرف|غرفة)',
-            "da": r'(\d+)\s*(bit|biyout|byout|chombrat|chambre|غرفة)'  # Ajout des mots en darija
-        }
-        
-        match = re.search(patterns[lang.value], message.lower())
+    def _number(pattern, message_lower: str) -> Optional[int]:
+        match = pattern.search(message_lower)
         return int(match.group(1)) if match else None
 
+    @staticmethod
+    def extract_number(message: str, lang: Language) -> Optional[int]:
+        return LanguageManager._number(LanguageManager._ROOMS_RES[lang.value], message.lower())
+
     @staticmethod
     def extract_budget(message: str) -> Optional[int]:
-        # Support pour le darija ajouté (dh, derham, drahm)
-        pattern = r'(\d+)\s*(dollars?|dirham|dh|derham|drahm|usd|\$|درهم|دولار)'
-        match = re.search(pattern, message.lower())
-        return int(match.group(1)) if match else None
-        
+        return LanguageManager._number(LanguageManager._BUDGET_RE, message.lower())
+
     @staticmethod
-    def extract_city(message: str, lang: Language) -> Optional[str]:
-        pattern =r'(?:in|a|at|for|dans|f|fi|fmdint|fmdinat|à|في|فى|ف)\s+([A-Za-z\s]+?)(?=\s+|$|,|\sin|\sat)'
-        match = re.search(pattern, message.lower(), re.IGNORECASE)
+    def _city(message_lower: str) -> Optional[str]:
+        match = LanguageManager._CITY_RE.search(message_lower)
         if match:
             return match.group(1).strip()
         return None
 
+    @staticmethod
+    def extract_city(message: str, lang: Language) -> Optional[str]:
+        return LanguageManager._city(message.lower())
+
+    @staticmethod
+    def _amenities(message_lower: str) -> Tuple[str, ...]:
+        # Folding only changes accented and non-Latin text
+        text = message_lower if message_lower.isascii() else fold(message_lower)
+        bits = {LABEL_IDS[label] for label in LABEL_RE.findall(text)}
+        return tuple(VOCABULARY[bit][0] for bit in sorted(bits))
+
+    @staticmethod
+    def extract_amenities(message: str) -> List[str]:
+        """Canonical names of the amenities mentioned, in any of the four languages."""
+        return list(LanguageManager._amenities(message.lower()))
+
+    @staticmethod
+    def analyze(message: str, lang: Optional[Language] = None) -> "MessageAnalysis":
+        """
+        Run the whole pipeline on one message: the text is lowercased once and
+        every precompiled pattern reads that same string. The language is
+        detected unless `lang` is given (i.e. after the greeting).
+        """
+        message_lower = message.lower()
+        stripped = message_lower.strip()
+        language = lang if lang is not None else LanguageManager._detect(message_lower)
+        return MessageAnalysis(
+            language=language,
+            is_greeting=stripped in LanguageManager._ALL_GREETINGS,
+            is_more=stripped in LanguageManager._ALL_MORE_WORDS,
+            rooms=LanguageManager._number(LanguageManager._ROOMS_RES[language.value], message_lower),
+            budget=LanguageManager._number(LanguageManager._BUDGET_RE, message_lower),
+            city=LanguageManager._city(message_lower),
+            text=message_lower,
+        )
+
+
+class MessageAnalysis(NamedTuple):
+    """Language and entities found in one inbound message."""
+    language: Language
+    is_greeting: bool
+    is_more: bool
+    rooms: Optional[int]
+    budget: Optional[int]
+    city: Optional[str]
+    # Lowercased message, for the entities only some states look for
+    text: str = ""
+
+    @property
+    def amenities(self) -> Tuple[str, ...]:
+        """Canonical names of the amenities mentioned, extracted on each access."""
+        return LanguageManager._amenities(self.text)
@@ -0,0 +1,204 @@
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, from sub-millisecond NLU work to slow Graph API calls
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Series for these label values; keep the result around on hot paths."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _render_child(self, values, child):
+        yield f"{self.name}{_labels(self.labelnames, values)} {child.value:g}"
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        cumulative = 0
+        for bound, n in zip(self.bounds + (float('inf'),), counts):
+            cumulative += n
+            le = '+Inf' if bound == float('inf') else f'{bound:g}'
+            labels = _labels(self.labelnames, values, 'le="' + le + '"')
+            yield f"{self.name}_bucket{labels} {cumulative}"
+        yield f"{self.name}_sum{_labels(self.labelnames, values)} {total:g}"
+        yield f"{self.name}_count{_labels(self.labelnames, values)} {count}"
+
+
+class Registry:
+    """The metrics of this process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'immobot_stage_seconds', 'Time spent in each stage of handling a webhook.', ('stage',)))
+MESSAGES = REGISTRY.register(Counter(
+    'immobot_messages_total', 'Messages processed, by conversation state on arrival and language.',
+    ('state', 'language')))
+SENDS = REGISTRY.register(Counter(
+    'immobot_sends_total', 'Replies sent to the Graph API, by result.', ('result',)))
+ERRORS = REGISTRY.register(Counter(
+    'immobot_errors_total', 'Errors caught while answering a message, by component.', ('component',)))
+DELIVERY_STATUSES = REGISTRY.register(Counter(
+    'immobot_delivery_statuses_total', 'Delivery status callbacks stored, by status.', ('status',)))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Per-request stage durations, only collected while a profiled request runs
+_breakdown: ContextVar[Optional[Dict[str, float]]] = ContextVar('immobot_stage_breakdown', default=None)
+
+
+@contextmanager
+def stage_breakdown():
+    """Collect the seconds spent in each timed stage by the code run inside the block."""
+    stages: Dict[str, float] = {}
+    token = _breakdown.set(stages)
+    try:
+        yield stages
+    finally:
+        _breakdown.reset(token)
+
+
+def _observe(series, stage: str, elapsed: float) -> None:
+    series.observe(elapsed)
+    stages = _breakdown.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + elapsed
+
+
+class timed:
+    """
+    Record the duration of a block (`with timed("search"):`) or of every
+    call of a function (`@timed("total")`) in immobot_stage_seconds.
+    """
+    __slots__ = ('_stage', '_series', '_start')
+
+    def __init__(self, stage: str):
+        self._stage = stage
+        self._series = STAGE_SECONDS.labels(stage)
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _observe(self._series, self._stage, perf_counter() - self._start)
+        return False
+
+    def __call__(self, func):
+        stage, series = self._stage, self._series
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _observe(series, stage, perf_counter() - start)
+
+        return wrapper
@@ -0,0 +1,177 @@
+import heapq
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from immobot_config.amenities import amenity_mask, property_mask
+
+
+class Query(NamedTuple):
+    """Search criteria parsed once per search instead of once per property."""
+    budget: Optional[float]
+    rooms: Optional[int]
+    city: Optional[str]
+    # Bitmask of required amenities (see amenities.VOCABULARY), 0 for none
+    amenities: int = 0
+
+
+def normalize_city(city) -> str:
+    return str(city).lower()
+
+
+def normalize_criteria(criteria: Dict) -> Query:
+    """
+    Parse the user's criteria the same way `_matches_criteria` does.
+    Raises ValueError or TypeError for criteria that cannot be parsed.
+    """
+    return Query(
+        budget=float(criteria['budget']) if criteria.get('budget') else None,
+        rooms=int(criteria['rooms']) if criteria.get('rooms') else None,
+        city=normalize_city(criteria['city']) if criteria.get('city') else None,
+        amenities=amenity_mask(criteria.get('amenities') or ()),
+    )
+
+
+# Bucket key: (normalized city or None, rooms or None), None meaning "any"
+BucketKey = Tuple[Optional[str], Optional[int]]
+
+
+class PropertyIndex:
+    """
+    Indexes of the available properties, built once when the catalog is loaded.
+
+    Every property is filed under four composite buckets: (city, rooms),
+    (city, any), (any, rooms) and (any, any), so any combination of the city
+    and rooms criteria is a single hash lookup. Each bucket keeps its rows
+    sorted by price, and the budget is applied by bisecting that array.
+    Requested amenities are one AND per remaining row against `masks`.
+    Matches are returned in catalog order, like a linear scan would.
+    """
+
+    def __init__(self, properties: Sequence[Dict]):
+        self.properties = properties
+        self.buckets: Dict[BucketKey, Tuple[array, array]] = {}
+        self.masks = array('Q', [0]) * len(properties)
+
+        rows = []
+        for row, prop in enumerate(properties):
+            # Empty slots (None) are listings removed by a catalog reload
+            entry = self._entry(prop) if prop is not None else None
+            if entry is not None:
+                price, city, rooms = entry
+                rows.append((price, row, city, rooms))
+                self.masks[row] = property_mask(prop)
+
+        # Filing rows in global price order leaves every bucket sorted by price
+        rows.sort()
+        for price, row, city, rooms in rows:
+            for key in ((city, rooms), (city, None), (None, rooms), (None, None)):
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    bucket = self.buckets[key] = (array('d'), array('q'))
+                bucket[0].append(price)
+                bucket[1].append(row)
+
+    def snapshot_state(self) -> Dict:
+        """Buckets and masks as plain values marshal can store (see snapshot.py)."""
+        return {
+            'buckets': [(city, rooms, prices.tobytes(), rows.tobytes())
+                        for (city, rooms), (prices, rows) in self.buckets.items()],
+            'masks': self.masks.tobytes(),
+        }
+
+    @classmethod
+    def from_snapshot_state(cls, properties: Sequence[Optional[Dict]], state: Dict) -> "PropertyIndex":
+        """Index of `properties` restored from `snapshot_state`, without re-filing any row."""
+        index = cls.__new__(cls)
+        index.properties = properties
+        index.buckets = {}
+        for city, rooms, prices, rows in state['buckets']:
+            bucket = index.buckets[(city, rooms)] = (array('d'), array('q'))
+            bucket[0].frombytes(prices)
+            bucket[1].frombytes(rows)
+        index.masks = array('Q')
+        index.masks.frombytes(state['masks'])
+        if len(index.masks) != len(properties):
+            raise ValueError("snapshot index does not match its properties")
+        return index
+
+    def city_names(self) -> List[str]:
+        """Normalized cities with at least one available listing."""
+        return [city for city, rooms in self.buckets if city is not None and rooms is None]
+
+    def find(self, query: Query, limit: Optional[int] = None) -> List[Dict]:
+        bucket = self.buckets.get((query.city, query.rooms))
+        if bucket is None:
+            return []
+        prices, rows = bucket
+        if query.budget is not None:
+            rows = rows[:bisect_right(prices, query.budget)]
+        if query.amenities:
+            need, masks = query.amenities, self.masks
+            rows = [row for row in rows if masks[row] & need == need]
+        rows = sorted(rows) if limit is None else heapq.nsmallest(limit, rows)
+        return [self.properties[row] for row in rows]
+
+    @staticmethod
+    def _entry(prop: Dict):
+        if not prop.get('available', True):
+            return None
+        try:
+            return float(prop['price']), normalize_city(prop['city']), prop['rooms']
+        except (KeyError, ValueError, TypeError) as e:
+            logging.warning(f"Skipping malformed property {prop.get('id')}: {e}")
+            return None
+
+    def updated(self, properties: Sequence[Dict], removed: Dict[int, Dict], added: Sequence[int]) -> "PropertyIndex":
+        """
+        Return a new index for `properties`, given the rows whose old version
+        (`removed`, row -> old property) left and the rows that now hold a new
+        version (`added`). Only the buckets those rows belong to are copied;
+        every other bucket is shared with this index, which stays valid for
+        searches still running against the previous catalog.
+        """
+        new = PropertyIndex.__new__(PropertyIndex)
+        new.properties = properties
+        new.buckets = dict(self.buckets)
+        # Appended rows get a mask slot; removed rows keep a stale one no bucket points to
+        new.masks = array('Q', self.masks)
+        new.masks.extend(array('Q', [0]) * (len(properties) - len(new.masks)))
+        copied = set()
+
+        def writable(key):
+            if key not in copied:
+                prices, rows = new.buckets.get(key) or (array('d'), array('q'))
+                new.buckets[key] = (array('d', prices), array('q', rows))
+                copied.add(key)
+            return new.buckets[key]
+
+        for row, prop in removed.items():
+            entry = self._entry(prop)
+            if entry is None:
+                continue
+            price, city, rooms = entry
+            for key in ((city, rooms), (city, None), (None, rooms), (None, None)):
+                prices, rows = writable(key)
+                i = bisect_left(prices, price)
+                while rows[i] != row:
+                    i += 1
+                del prices[i]
+                del rows[i]
+                if not rows:
+                    del new.buckets[key]
+                    copied.discard(key)
+
+        for row in added:
+            entry = self._entry(properties[row])
+            if entry is None:
+                continue
+            new.masks[row] = property_mask(properties[row])
+            price, city, rooms = entry
+            for key in ((city, rooms), (city, None), (None, rooms), (None, None)):
+                prices, rows = writable(key)
+                i = bisect_right(prices, price)
+                prices.insert(i, price)
+                rows.insert(i, row)
+        return new
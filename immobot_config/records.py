@@ -0,0 +1,236 @@
+import sys
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+# Fields of a rooms_database.json listing, stored in slots; any other key
+# goes to the record's `extra` dict
+PROPERTY_FIELDS = ('id', 'rooms', 'price', 'currency', 'city', 'available', 'address',
+                   'amenities', 'photos', 'description', 'agent', 'created_at')
+_FIELDS = frozenset(PROPERTY_FIELDS)
+
+class Property(Mapping):
+    """
+    One catalog listing in slots instead of a dict.
+
+    It reads like the listing's JSON object (`prop['city']`, `prop.get('agent')`,
+    `prop['amenities']['fr']`), so searching, ranking and rendering code does
+    not know the difference. Lists are stored as tuples and nested objects as
+    read-only mappings, because equal ones are shared between listings (see
+    RecordBuilder). Absent fields are unset slots, so `get` still returns the
+    default for them.
+    """
+    __slots__ = PROPERTY_FIELDS + ('extra',)
+
+    def __getitem__(self, key):
+        if key in _FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+
+    def get(self, key, default=None):
+        # Mapping.get goes through __getitem__ and an exception for absent fields
+        if key in _FIELDS:
+            return getattr(self, key, default)
+        return self.extra.get(key, default) if self.extra is not None else default
+
+    def __contains__(self, key) -> bool:
+        if key in _FIELDS:
+            return hasattr(self, key)
+        return self.extra is not None and key in self.extra
+
+    def __iter__(self) -> Iterator[str]:
+        for name in PROPERTY_FIELDS:
+            if hasattr(self, name):
+                yield name
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, Property):
+            return all(getattr(self, name, None) == getattr(other, name, None)
+                       and hasattr(self, name) == hasattr(other, name)
+                       for name in self.__slots__)
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Property({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict:
+        """The listing as plain JSON values (dicts and lists)."""
+        return {key: _plain(value) for key, value in self.items()}
+
+
+def _plain(value):
+    if isinstance(value, Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_plain(item) for item in value]
+    return value
+
+
+class RecordBuilder:
+    """
+    Turns catalog dicts into Property records. City, currency and amenity
+    strings are interned; other equal strings, lists and objects are stored
+    once per builder and shared by every listing that has them (the amenity
+    translations or a repeated description are then one object for the whole
+    catalog). Use one builder per catalog load, so values of listings that
+    were since removed are not kept alive.
+    """
+
+    def __init__(self):
+        self._strings: Dict[str, str] = {}
+        self._lists: Dict[tuple, tuple] = {}
+        self._objects: Dict[tuple, MappingProxyType] = {}
+        # How each field is stored; None keeps the parsed value (numbers,
+        # and strings unique to each listing)
+        self._converters: Dict[str, Optional[Callable]] = {
+            'id': None, 'rooms': None, 'price': None, 'available': None, 'created_at': None,
+            'currency': self._interned, 'city': self._interned,
+            'address': self._shared, 'agent': self._shared, 'photos': self._shared,
+            'description': self._shared, 'amenities': self._amenities,
+        }
+
+    def _freeze(self, value, intern: bool = False):
+        """Read-only, deduplicated copy of any JSON value."""
+        if isinstance(value, str):
+            return sys.intern(value) if intern else self._strings.setdefault(value, value)
+        if isinstance(value, list):
+            return tuple([self._freeze(item, intern) for item in value])
+        if isinstance(value, dict):
+            return MappingProxyType({sys.intern(key): self._freeze(item, intern) for key, item in value.items()})
+        return value
+
+    def _shared(self, value, intern: bool = False):
+        """
+        `_freeze(value)`, looked up first by a key built without recursion for
+        the usual shapes (a list of strings, an object of strings or of lists
+        of strings), so a value seen before costs one dict lookup.
+        """
+        kind = type(value)
+        if kind is str:
+            return self._strings.setdefault(value, value)
+        try:
+            if kind is list:
+                key = tuple(value)
+                shared = self._lists.get(key)
+                if shared is None:
+                    # Hashable, so a tuple of plain values: already its frozen form
+                    shared = self._lists[key] = self._freeze(value, True) if intern else key
+                return shared
+            if kind is dict:
+                key = tuple([(k, tuple(v) if type(v) is list else v) for k, v in value.items()])
+                shared = self._objects.get(key)
+                if shared is None:
+                    shared = self._objects[key] = self._freeze(value, intern)
+                return shared
+        except TypeError:  # Nested deeper than that: not shared
+            pass
+        return self._freeze(value, intern)
+
+    def _interned(self, value):
+        return sys.intern(value) if type(value) is str else self._shared(value)
+
+    def _amenities(self, value):
+        return self._shared(value, intern=True)
+
+    def build(self, prop: Optional[Dict]) -> Optional[Property]:
+        """Record of `prop` (None stays None, records are returned as they are)."""
+        if prop is None or isinstance(prop, Property):
+            return prop
+        record = Property()
+        extra = None
+        converters = self._converters
+        for key, value in prop.items():
+            if key in converters:
+                convert = converters[key]
+                setattr(record, key, value if convert is None else convert(value))
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = self._shared(value)
+        record.extra = extra
+        return record
+
+def to_records(properties: Iterable[Optional[Dict]]) -> List[Optional[Property]]:
+    """Records of a whole catalog, built with one RecordBuilder."""
+    builder = RecordBuilder()
+    return [builder.build(prop) for prop in properties]
+
+
+# Field values stored by dump_records; Ellipsis marks an absent field
+_STATE_FIELDS = PROPERTY_FIELDS + ('extra',)
+
+
+def _plain_shared(value, memo: Dict[int, object]):
+    # Read-only mappings become dicts, one per shared mapping, so marshal
+    # writes a shared value once and loading shares it again
+    kind = type(value)
+    if kind is MappingProxyType or kind is tuple or kind is dict:
+        plain = memo.get(id(value))
+        if plain is None:
+            if kind is tuple:
+                plain = tuple([_plain_shared(item, memo) for item in value])
+            else:
+                plain = {key: _plain_shared(item, memo) for key, item in value.items()}
+            memo[id(value)] = plain
+        return plain
+    return value
+
+
+def _frozen_shared(value, memo: Dict[int, object]):
+    kind = type(value)
+    if kind is dict or kind is tuple:
+        frozen = memo.get(id(value))
+        if frozen is None:
+            if kind is tuple:
+                frozen = value
+                if any(type(item) is dict or type(item) is tuple for item in value):
+                    frozen = tuple([_frozen_shared(item, memo) for item in value])
+            else:
+                frozen = MappingProxyType({key: _frozen_shared(item, memo) for key, item in value.items()})
+            memo[id(value)] = frozen
+        return frozen
+    return value
+
+
+def dump_records(records: Iterable[Optional[Property]]) -> List[Optional[tuple]]:
+    """Records as marshal-able tuples (see snapshot.py); values shared between records stay shared."""
+    memo: Dict[int, object] = {}
+    return [
+        None if record is None
+        else tuple([_plain_shared(getattr(record, name, ...), memo) for name in _STATE_FIELDS])
+        for record in records
+    ]
+
+
+def load_records(rows: Iterable[Optional[tuple]]) -> List[Optional[Property]]:
+    """Inverse of dump_records."""
+    memo: Dict[int, object] = {}
+    records = []
+    for row in rows:
+        if row is None:
+            records.append(None)
+            continue
+        record = Property()
+        for name, value in zip(_STATE_FIELDS, row):
+            if value is ...:
+                continue
+            if name == 'extra' and value is not None:
+                # The record's own dict of unknown fields, not a shared mapping
+                value = {key: _frozen_shared(item, memo) for key, item in value.items()}
+            else:
+                value = _frozen_shared(value, memo)
+            setattr(record, name, value)
+        records.append(record)
+    return records
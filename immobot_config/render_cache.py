@@ -0,0 +1,62 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+
+class RenderCache:
+    """
+    Bounded LRU cache of rendered listings keyed by (property id, language).
+
+    Entries belong to one catalog generation: the first lookup made with a
+    newer generation empties the cache, so a reloaded listing is never served
+    with its old text. Lookups made with an older generation (a search that
+    started before the reload) are rendered but not cached.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _sync(self, generation: int) -> bool:
+        # Called with the lock held, returns False for a stale generation
+        if generation > self.generation:
+            self._entries.clear()
+            self.generation = generation
+        return generation == self.generation
+
+    def get(self, key: Hashable, generation: int) -> Optional[str]:
+        with self._lock:
+            if not self._sync(generation):
+                return None
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key: Hashable, generation: int, text: str) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if not self._sync(generation):
+                return
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_render(self, key: Hashable, generation: int, render: Callable[[], str]) -> str:
+        text = self.get(key, generation)
+        if text is None:
+            text = render()
+            self.put(key, generation, text)
+        return text
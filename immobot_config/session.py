@@ -0,0 +1,269 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional
+
+from immobot_config.language import Language
+
+
+def empty_criteria() -> Dict:
+    return {
+        'budget': None,
+        'rooms': None,
+        'city': None,
+        'amenities': []
+    }
+
+
+@dataclass
+class Session:
+    """Conversation state of one WhatsApp user (keyed by wa_id)."""
+    wa_id: str
+    current_state: str = "GREETING"
+    current_language: Language = Language.FR
+    user_info: Dict = field(default_factory=empty_criteria)
+    # Position in the last search results, for the "more" command
+    cursor: Optional[Dict] = None
+
+    def reset(self) -> None:
+        self.current_state = "GREETING"
+        self.user_info = empty_criteria()
+
+    def to_dict(self) -> Dict:
+        return {
+            'wa_id': self.wa_id,
+            'current_state': self.current_state,
+            'current_language': self.current_language.value,
+            'user_info': self.user_info,
+            'cursor': self.cursor,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Session":
+        return cls(
+            wa_id=data['wa_id'],
+            current_state=data['current_state'],
+            current_language=Language(data['current_language']),
+            user_info=data['user_info'],
+            cursor=data.get('cursor'),
+        )
+
+
+class _Entry:
+    __slots__ = ("session", "lock", "last_seen")
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+
+
+class SessionStore:
+    """
+    In-memory session store with LRU + idle-TTL eviction.
+
+    At most `max_sessions` conversations are kept (a count, not bytes: a
+    session in the middle of a search takes about 1 KB); the least recently
+    used ones are dropped first, and any conversation idle for longer than
+    `ttl` seconds is dropped as well, by a full sweep at most once every
+    PURGE_INTERVAL seconds. Each wa_id has its own lock so messages of one
+    user are handled one at a time while other users run in parallel.
+    """
+
+    # Seconds between two sweeps of every idle session, run by session()
+    PURGE_INTERVAL = 60.0
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 1800.0):
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, wa_id: str) -> bool:
+        return wa_id in self._entries
+
+    def _get_entry(self, wa_id: str) -> _Entry:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(wa_id)
+            if entry is not None and now - entry.last_seen > self.ttl and not entry.lock.locked():
+                # Idle for too long: start the conversation over
+                del self._entries[wa_id]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                entry = _Entry(Session(wa_id=wa_id))
+                self._entries[wa_id] = entry
+            else:
+                self._entries.move_to_end(wa_id)
+            entry.last_seen = now
+            self._evict(now)
+            if now - self._last_purge >= self.PURGE_INTERVAL:
+                self._purge(now)
+            return entry
+
+    def peek(self, wa_id: str) -> Optional[Session]:
+        """The current session of `wa_id` without locking or touching it (for diagnostics)."""
+        entry = self._entries.get(wa_id)
+        return entry.session if entry is not None else None
+
+    def _evict(self, now: float) -> None:
+        # Oldest entries sit at the front; busy ones are skipped, not dropped
+        for _ in range(len(self._entries)):
+            wa_id, entry = next(iter(self._entries.items()))
+            over_capacity = len(self._entries) > self.max_sessions
+            expired = now - entry.last_seen > self.ttl
+            if not (over_capacity or expired):
+                break
+            if entry.lock.locked():
+                self._entries.move_to_end(wa_id)
+                continue
+            del self._entries[wa_id]
+            self.evictions += 1
+
+    @contextmanager
+    def session(self, wa_id: str) -> Iterator[Session]:
+        """Lock and yield the session of `wa_id`, creating it if needed."""
+        entry = self._get_entry(wa_id)
+        with entry.lock:
+            try:
+                yield entry.session
+            finally:
+                entry.last_seen = time.monotonic()
+
+    def _purge(self, now: float) -> int:
+        # _evict stops at the first live session, but busy sessions it skipped
+        # were moved behind newer ones: look at every entry
+        self._last_purge = now
+        expired = [
+            wa_id for wa_id, entry in self._entries.items()
+            if now - entry.last_seen > self.ttl and not entry.lock.locked()
+        ]
+        for wa_id in expired:
+            del self._entries[wa_id]
+        self.evictions += len(expired)
+        return len(expired)
+
+    def purge_expired(self) -> int:
+        """Drop every idle session, returns how many were removed."""
+        with self._lock:
+            return self._purge(time.monotonic())
+
+
+class SessionConflict(Exception):
+    """Another process saved the session between our read and our write."""
+
+
+class SqliteSessionStore:
+    """
+    Session store in a SQLite WAL file, shared by every worker process.
+
+    Writes use optimistic concurrency: each row carries a version, and a
+    session is only saved if nobody saved it since it was read. Otherwise
+    `session()` raises SessionConflict and the caller processes the message
+    again against the fresh state. Sessions idle for longer than `ttl` start
+    over, like in SessionStore.
+    """
+
+    # Expired sessions are deleted once every this many saves
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str, ttl: float = 1800.0):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.saves = 0
+        self.conflicts = 0
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "wa_id TEXT PRIMARY KEY, version INTEGER NOT NULL, updated_at REAL NOT NULL, data TEXT NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def __contains__(self, wa_id: str) -> bool:
+        return self.connection.execute("SELECT 1 FROM sessions WHERE wa_id = ?", (wa_id,)).fetchone() is not None
+
+    def _load(self, wa_id: str):
+        row = self.connection.execute(
+            "SELECT version, updated_at, data FROM sessions WHERE wa_id = ?", (wa_id,)
+        ).fetchone()
+        if row is None:
+            return Session(wa_id=wa_id), None
+        version, updated_at, data = row
+        if time.time() - updated_at > self.ttl:
+            # Idle for too long: start the conversation over
+            return Session(wa_id=wa_id), version
+        return Session.from_dict(json.loads(data)), version
+
+    def peek(self, wa_id: str) -> Optional[Session]:
+        """The stored session of `wa_id`, None if there is none (for diagnostics)."""
+        session, version = self._load(wa_id)
+        return session if version is not None else None
+
+    def _save(self, session: Session, version: Optional[int]) -> bool:
+        data = json.dumps(session.to_dict(), ensure_ascii=False, separators=(',', ':'))
+        now = time.time()
+        if version is None:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO sessions (wa_id, version, updated_at, data) VALUES (?, 0, ?, ?)",
+                (session.wa_id, now, data),
+            )
+        else:
+            cursor = self.connection.execute(
+                "UPDATE sessions SET version = version + 1, updated_at = ?, data = ? WHERE wa_id = ? AND version = ?",
+                (now, data, session.wa_id, version),
+            )
+        return cursor.rowcount == 1
+
+    @contextmanager
+    def session(self, wa_id: str) -> Iterator[Session]:
+        """
+        Yield the session of `wa_id` and save it afterwards.
+        Raises SessionConflict if it was saved by someone else in between.
+        """
+        session, version = self._load(wa_id)
+        yield session
+        saved = self._save(session, version)
+        with self._lock:
+            if not saved:
+                self.conflicts += 1
+            else:
+                self.saves += 1
+                purge = self.saves % self.PURGE_EVERY == 0
+        if not saved:
+            raise SessionConflict(wa_id)
+        if purge:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Drop every idle session, returns how many were removed."""
+        return self.connection.execute(
+            "DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,)
+        ).rowcount
@@ -0,0 +1,72 @@
+import logging
+import marshal
+import os
+import struct
+import sys
+from typing import Any, Optional, Tuple
+
+# Header: magic, snapshot format version, marshal format version, Python
+# major.minor, byte order, then the mtime (ns) and size of the JSON catalog it
+# was built from. A snapshot is only used when every field matches: marshal
+# and the index arrays are specific to the interpreter and the machine.
+MAGIC = b"IMMOSNAP"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<8sHHHcxqq")
+_RUNTIME = (marshal.version, sys.version_info[0] << 8 | sys.version_info[1], sys.byteorder[0].encode())
+
+SourceStat = Tuple[int, int]
+
+
+def source_stat(path: str) -> Optional[SourceStat]:
+    """(mtime_ns, size) of the catalog file, None if it cannot be read."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def write_snapshot(path: str, payload: Any, source: SourceStat) -> None:
+    """
+    Write `payload` (anything marshal accepts) next to a header describing
+    `source`. The file is replaced atomically, so readers in other processes
+    see the old snapshot or the new one, never half of it.
+    """
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, *_RUNTIME, *source)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            marshal.dump(payload, f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_snapshot(path: str, source: Optional[SourceStat]) -> Optional[Any]:
+    """The payload of the snapshot at `path` if it was built from `source`, else None."""
+    if source is None:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logging.warning(f"Cannot read catalog snapshot {path}: {e}")
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    magic, version, marshal_version, python, byteorder, mtime_ns, size = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION or (marshal_version, python, byteorder) != _RUNTIME:
+        logging.info(f"Catalog snapshot {path} was written by another version, ignoring it")
+        return None
+    if (mtime_ns, size) != tuple(source):
+        logging.info(f"Catalog snapshot {path} is older than the catalog, ignoring it")
+        return None
+    try:
+        return marshal.loads(memoryview(data)[_HEADER.size:])
+    except (EOFError, ValueError, TypeError) as e:
+        logging.warning(f"Catalog snapshot {path} is corrupt, ignoring it: {e}")
+        return None
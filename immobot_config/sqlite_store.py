@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from immobot_config.amenities import property_mask
+from immobot_config.query import Query, normalize_city
+
+# Stored as PRAGMA user_version; files written by an older version are re-imported
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE properties (
+    row INTEGER PRIMARY KEY,
+    id TEXT,
+    city TEXT,
+    rooms INTEGER,
+    price NUMERIC,
+    available INTEGER NOT NULL,
+    created_at TEXT,
+    amenities INTEGER NOT NULL DEFAULT 0,
+    doc TEXT NOT NULL
+);
+"""
+
+# Created after the bulk insert, which is much faster than maintaining them row by row
+INDEXES = """
+CREATE INDEX properties_city_rooms_price ON properties (city, rooms, price) WHERE available = 1;
+CREATE INDEX properties_rooms_price ON properties (rooms, price) WHERE available = 1;
+CREATE INDEX properties_price ON properties (price) WHERE available = 1;
+"""
+
+
+def iter_json_array(f, chunk_size: int = 1 << 20) -> Iterator[Dict]:
+    """
+    Yield the elements of a top-level JSON array one by one, reading `f` in
+    chunks so the whole catalog never has to be held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def skip_whitespace():
+        nonlocal buf, pos, eof
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            buf, pos = f.read(chunk_size), 0
+            eof = not buf
+
+    skip_whitespace()
+    if pos >= len(buf) or buf[pos] != '[':
+        raise ValueError("Catalog must be a JSON array")
+    pos += 1
+    skip_whitespace()
+    if pos < len(buf) and buf[pos] == ']':
+        return
+    while True:
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Element cut by the chunk boundary: read more and try again
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield item
+        pos = end
+        skip_whitespace()
+        if pos >= len(buf):
+            raise ValueError("Unterminated JSON array in catalog")
+        if buf[pos] == ']':
+            return
+        if buf[pos] != ',':
+            raise ValueError(f"Unexpected {buf[pos]!r} between catalog entries")
+        pos += 1
+        skip_whitespace()
+
+
+def _row_values(row: int, prop: Dict):
+    try:
+        price = prop['price']
+        if not isinstance(price, (int, float)) or isinstance(price, bool):
+            raise TypeError(f"price {price!r} is not a number")
+        city, rooms = normalize_city(prop['city']), prop['rooms']
+        if not isinstance(rooms, int):
+            raise TypeError(f"rooms {rooms!r} is not an integer")
+        available = 1 if prop.get('available', True) else 0
+    except (KeyError, ValueError, TypeError) as e:
+        # Malformed rows are stored but never matched, like in PropertyIndex
+        logging.warning(f"Skipping malformed property {prop.get('id')}: {e}")
+        city = rooms = price = None
+        available = 0
+    return (row, prop.get('id'), city, rooms, price, available, prop.get('created_at'), property_mask(prop),
+            json.dumps(prop, ensure_ascii=False, separators=(',', ':')))
+
+
+def import_catalog(properties: Iterable[Dict], db_path: str, batch_size: int = 5000) -> None:
+    """
+    Write `properties` into a new SQLite file and atomically move it to
+    `db_path`. Readers that already opened the previous file keep reading it.
+    """
+    tmp_path = f"{db_path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+        batch = []
+        for row, prop in enumerate(properties):
+            batch.append(_row_values(row, prop))
+            if len(batch) >= batch_size:
+                conn.executemany("INSERT INTO properties VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                batch = []
+        if batch:
+            conn.executemany("INSERT INTO properties VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        conn.executescript(INDEXES)
+        conn.execute("ANALYZE")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+
+
+def schema_version(db_path: str) -> int:
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def import_catalog_file(json_path: str, db_path: str) -> None:
+    """Stream `json_path` into the SQLite catalog at `db_path`."""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        import_catalog(iter_json_array(f), db_path)
+
+
+class SqliteIndex:
+    """
+    Catalog backend that answers searches with indexed SQL queries.
+
+    Only the matching rows are read, and a listing's full JSON document is
+    fetched the first time a field other than id/rooms/price/created_at
+    (what searches and ranking need) is used. Each
+    thread (and each forked worker process) gets its own read-only
+    connection, so several processes can share one on-disk catalog. A
+    published file is never modified: updates write a new file and replace it.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self.properties = SqliteRows(self)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # immutable: published files are replaced, never written, so no locking is needed
+            uri = Path(self.db_path).resolve().as_uri()
+            conn = sqlite3.connect(f"{uri}?mode=ro&immutable=1", uri=True)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM properties").fetchone()[0]
+
+    def city_names(self) -> List[str]:
+        """Normalized cities with at least one available listing."""
+        return [city for (city,) in self.connection.execute(
+            "SELECT DISTINCT city FROM properties WHERE available = 1 AND city IS NOT NULL")]
+
+    def fetch_doc(self, row: int) -> Dict:
+        found = self.connection.execute("SELECT doc FROM properties WHERE row = ?", (row,)).fetchone()
+        if found is None:
+            raise IndexError("property index out of range")
+        return json.loads(found[0])
+
+    def find(self, query: Query, limit: Optional[int] = None) -> List[Dict]:
+        sql = "SELECT row, id, rooms, price, created_at FROM properties WHERE available = 1"
+        params = []
+        if query.city is not None:
+            sql += " AND city = ?"
+            params.append(query.city)
+        if query.rooms is not None:
+            sql += " AND rooms = ?"
+            params.append(query.rooms)
+        if query.budget is not None:
+            sql += " AND price <= ?"
+            params.append(query.budget)
+        if query.amenities:
+            sql += " AND amenities & ? = ?"
+            params.extend((query.amenities, query.amenities))
+        sql += " ORDER BY row"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [
+            LazyProperty(self, row, {'id': prop_id, 'rooms': rooms, 'price': price, 'created_at': created_at})
+            for row, prop_id, rooms, price, created_at in self.connection.execute(sql, params)
+        ]
+
+
+class LazyProperty(Mapping):
+    """Property read from SQLite; the full document is loaded on first use."""
+    __slots__ = ('_index', '_row', '_columns', '_doc')
+
+    def __init__(self, index: SqliteIndex, row: int, columns: Dict):
+        self._index = index
+        self._row = row
+        self._columns = columns
+        self._doc = None
+
+    def _load(self) -> Dict:
+        if self._doc is None:
+            self._doc = self._index.fetch_doc(self._row)
+        return self._doc
+
+    def __getitem__(self, key):
+        if key in self._columns:
+            return self._columns[key]
+        return self._load()[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._load()
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def __repr__(self) -> str:
+        return f"LazyProperty({self._columns.get('id')!r})"
+
+
+class SqliteRows(Sequence):
+    """Read-only list view over the rows of a SqliteIndex."""
+
+    def __init__(self, index: SqliteIndex):
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(len(self))[item]]
+        if item < 0:
+            item += len(self)
+        return self._index.fetch_doc(item)
@@ -1,8 +1,12 @@
 import logging
 
 from app import create_app
+from WhatsApp_config.whatsapp_resp import get_outbox
 
 app = create_app()
+# Send the replies a previous process recorded but never delivered; with
+# run_workers.py each worker starts its own outbox instead of the parent
+get_outbox(app.config)
 
 if __name__ == "__main__":
     logging.info("Flask app started")
@@ -0,0 +1,98 @@
+import atexit
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+
+from werkzeug.serving import make_server
+
+from app import create_app
+from WhatsApp_config.whatsapp_resp import get_dialogue_manager, get_outbox, start_catalog_watcher
+
+HOST = "0.0.0.0"
+PORT = int(os.getenv("PORT", "80"))
+
+
+def serve(app, sock):
+    """Worker process: serve requests on the shared listening socket."""
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    # The parent's watcher and outbox threads did not survive the fork
+    start_catalog_watcher(app.config)
+    get_outbox(app.config)
+    server = make_server(HOST, PORT, app, threaded=True, fd=sock.fileno())
+    logging.info(f"Worker {os.getpid()} serving")
+    server.serve_forever()
+
+
+def spawn(app, sock):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            serve(app, sock)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 0
+        except KeyboardInterrupt:
+            code = 130
+        except BaseException:
+            logging.exception(f"Worker {os.getpid()} crashed")
+            code = 1
+        finally:
+            # os._exit skips atexit: drain the queued messages, replies,
+            # outbox writes and delivery statuses this worker acknowledged
+            try:
+                atexit._run_exitfuncs()
+            finally:
+                os._exit(code)
+    return pid
+
+
+def main():
+    # Catalog, indexes and dialogue manager are loaded once here and shared
+    # copy-on-write with the workers; gc.freeze keeps the collector from
+    # touching (and so copying) those objects in the children.
+    app = create_app()
+    config = app.config
+    # Each worker polls the catalog itself (see serve), the parent does not
+    get_dialogue_manager(start_watcher=False)
+    if not config["SESSION_SQLITE_PATH"]:
+        logging.warning("SESSION_SQLITE_PATH is not set: each worker keeps its own conversations")
+    if not config["DEDUPE_SQLITE_PATH"]:
+        logging.warning("DEDUPE_SQLITE_PATH is not set: redeliveries are only caught by the same worker")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+
+    gc.freeze()
+    workers = {spawn(app, sock) for _ in range(config["PROCESS_COUNT"])}
+    logging.info(f"Started {len(workers)} workers on port {PORT}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            logging.warning(f"Worker {pid} exited with status {status}, starting a new one")
+            workers.add(spawn(app, sock))
+
+
+if __name__ == "__main__":
+    main()
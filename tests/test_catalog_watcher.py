@@ -0,0 +1,29 @@
+import json
+import os
+
+import pytest
+
+from immobot_config.catalog_watcher import CatalogWatcher
+from immobot_config.database import PropertyDatabase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("use_hash", [False, True])
+def test_watcher_reloads_a_catalog_changed_before_it_started(tmp_path, use_hash):
+    """A worker forked after the file changed serves its parent's catalog until its watcher reloads it."""
+    with open(os.path.join(ROOT, "rooms_database.json"), encoding="utf-8") as f:
+        listings = json.load(f)
+    path = tmp_path / "rooms_database.json"
+    path.write_text(json.dumps(listings), encoding="utf-8")
+    database = PropertyDatabase(str(path), snapshot_path=str(tmp_path / "rooms_database.snapshot"), backend="index")
+    assert len(database.properties) == len(listings)
+
+    path.write_text(json.dumps(listings[:3]), encoding="utf-8")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    watcher = CatalogWatcher(database, use_hash=use_hash)
+
+    assert watcher.check()
+    assert sorted(p["id"] for p in database.properties if p is not None) == sorted(p["id"] for p in listings[:3])
+    assert not watcher.check()
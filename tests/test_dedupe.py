@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+import WhatsApp_config.whatsapp_resp as whatsapp_resp
+from benchmarks.payloads import sign, webhook_body
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_redelivery_of_a_failed_message_is_processed(backend, tmp_path, monkeypatch):
+    """A message whose reply could not be generated is answered when Meta delivers it again."""
+    monkeypatch.setenv("APP_SECRET", "secret")
+    monkeypatch.setenv("CATALOG_RELOAD_INTERVAL", "0")
+    monkeypatch.setenv("ASYNC_WEBHOOK", "false")
+    monkeypatch.setenv("DEDUPE_SQLITE_PATH", str(tmp_path / "dedupe.sqlite") if backend == "sqlite" else "")
+    monkeypatch.setattr(whatsapp_resp, "_deduper", None)
+
+    calls = []
+
+    def generate_reply(wa_id, text, config=None):
+        calls.append(text)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return "reply"
+
+    sent = []
+    monkeypatch.setattr(whatsapp_resp, "generate_reply", generate_reply)
+    monkeypatch.setattr(whatsapp_resp, "dispatch_reply", lambda wa_id, data, config=None, reply_id=None: sent.append(reply_id))
+
+    from app import create_app
+
+    client = create_app().test_client()
+    raw = json.dumps(webhook_body("212600000001", "bonjour", "wamid.in.1")).encode("utf-8")
+    headers = {"Content-Type": "application/json", "X-Hub-Signature-256": sign(raw, "secret")}
+
+    assert client.post("/webhook", data=raw, headers=headers).status_code == 500
+    assert client.post("/webhook", data=raw, headers=headers).status_code == 200
+    assert sent == ["wamid.in.1"]
+    # Answered now: a third delivery is a duplicate
+    assert client.post("/webhook", data=raw, headers=headers).status_code == 200
+    assert calls == ["bonjour", "bonjour"]
@@ -0,0 +1,47 @@
+import json
+import os
+import signal
+import socket
+import sqlite3
+import urllib.request
+
+from benchmarks.payloads import sign, status_body
+
+
+def test_sigterm_flushes_buffered_statuses(tmp_path, monkeypatch):
+    """A worker stopped with SIGTERM writes the statuses it acknowledged before exiting."""
+    path = tmp_path / "deliveries.sqlite"
+    monkeypatch.setenv("APP_SECRET", "secret")
+    monkeypatch.setenv("CATALOG_RELOAD_INTERVAL", "0")
+    monkeypatch.setenv("DELIVERY_SQLITE_PATH", str(path))
+    # Nothing is written before the worker exits
+    monkeypatch.setenv("DELIVERY_FLUSH_INTERVAL", "3600")
+
+    import run_workers
+    from app import create_app
+
+    app = create_app()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(16)
+    port = sock.getsockname()[1]
+    pid = run_workers.spawn(app, sock)
+    try:
+        raw = json.dumps(status_body("212600000001", "wamid.out.1", "delivered")).encode("utf-8")
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{port}/webhook",
+            data=raw,
+            headers={"Content-Type": "application/json", "X-Hub-Signature-256": sign(raw, "secret")},
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            assert response.status == 200
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        _, status = os.waitpid(pid, 0)
+        sock.close()
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute("SELECT id, recipient, delivered_at FROM deliveries").fetchall()
+    assert [(message_id, recipient) for message_id, recipient, _ in rows] == [("wamid.out.1", "212600000001")]
+    assert rows[0][2] is not None